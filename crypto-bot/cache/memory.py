@@ -1,9 +1,12 @@
-from typing import Dict, List, Set, Optional, Tuple, Any
-from collections import defaultdict, deque
-from dataclasses import dataclass, field
-from datetime import datetime, timedelta
+from typing import Dict, FrozenSet, Set, Optional, Tuple, Any
+from collections import OrderedDict
+from dataclasses import dataclass
 import asyncio
 import logging
+import sys
+import threading
+import time
+import weakref
 from contextlib import asynccontextmanager
 
 from config.settings import config
@@ -11,26 +14,28 @@ from config.settings import config
 logger = logging.getLogger(__name__)
 
 
-@dataclass
+@dataclass(slots=True)
 class PresetData:
     """Данные пресета в памяти"""
     id: int
     user_id: int
     name: str
-    pairs: List[str]
-    intervals: List[str]
+    pairs: FrozenSet[str]
+    intervals: FrozenSet[str]
     percent_change: float
     is_active: bool = True
+    
+    def __post_init__(self):
+        # Неизменяемые множества: дубли в списках из БД не плодят лишних подписок
+        self.pairs = frozenset(self.pairs)
+        self.intervals = frozenset(self.intervals)
 
 
-@dataclass
-class AlertRecord:
-    """Запись об отправленном алерте для дедупликации"""
-    user_id: int
-    symbol: str
-    interval: str
-    timestamp: datetime
-    percent_change: float
+# Получатели по возрастанию минимального порога и параллельный кортеж этих порогов
+Fanout = Tuple[Tuple[Tuple[int, Tuple[PresetData, ...]], ...], Tuple[float, ...]]
+_EMPTY_FANOUT: Fanout = ((), ())
+# Черновики ячеек подписок одной записи: (symbol, interval) -> user_id -> preset_ids
+SubscriptionCells = Dict[Tuple[str, str], Dict[int, FrozenSet[int]]]
 
 
 class MemoryCache:
@@ -38,34 +43,46 @@ class MemoryCache:
     
     def __init__(self):
         # FSM состояния пользователей
-        self.user_states: Dict[int, Dict[str, Any]] = {}
+        # LRU: самые давно использованные в начале, вытесняются сверх MAX_USER_STATES
+        self.user_states: OrderedDict[int, Dict[str, Any]] = OrderedDict()
         
-        # Активные пресеты: symbol -> interval -> user_id -> preset_ids
-        self.active_subscriptions: Dict[str, Dict[str, Dict[int, List[int]]]] = defaultdict(
-            lambda: defaultdict(lambda: defaultdict(list))
-        )
+        # Активные пресеты: (symbol, interval) -> user_id -> preset_ids
+        # Ячейки неизменяемы после публикации: писатель копирует ячейку один раз
+        # за запись, меняет копию на месте и подменяет ее одной записью в dict
+        self.active_subscriptions: Dict[Tuple[str, str], Dict[int, FrozenSet[int]]] = {}
+        # Готовые планы рассылки: (symbol, interval) -> (((user_id, presets), ...), (threshold, ...))
+        # Получатели и их пороги лежат в одной неизменяемой ячейке и всегда
+        # одного поколения; пересобираются писателями после изменения подписок
+        self._fanout: Dict[Tuple[str, str], Fanout] = {}
+        # Минимальный порог среди получателей ключа: (symbol, interval) -> percent_change
+        self._min_threshold: Dict[Tuple[str, str], float] = {}
         
         # Все пресеты для быстрого доступа
         self.presets: Dict[int, PresetData] = {}
         
+        # Пресеты пользователя: user_id -> preset_ids
+        self._user_presets: Dict[int, Set[int]] = {}
+        
+        # Счетчики для get_stats, обновляются при изменениях
+        self._total_subs = 0
+        self._active_presets = 0
+        # user_id -> количество активных пресетов
+        self._user_active: Dict[int, int] = {}
+        # symbol -> количество ключей (symbol, interval) в подписках
+        self._symbol_refs: Dict[str, int] = {}
+        
         # Газовые алерты: user_id -> threshold_gwei
         self.gas_alerts: Dict[int, float] = {}
+        # Неизменяемый снимок газовых алертов для чтения без блокировки
+        self._gas_snapshot: Tuple[Tuple[int, float], ...] = ()
         
-        # История алертов для дедупликации
-        self.alert_history: deque = deque(maxlen=config.ALERT_HISTORY_SIZE)
-        
-        # Блокировки для потокобезопасности
-        self._locks = {
-            'subscriptions': asyncio.Lock(),
-            'presets': asyncio.Lock(),
-            'gas_alerts': asyncio.Lock(),
-            'alerts': asyncio.Lock(),
-            'states': asyncio.Lock()
-        }
+        # Блокировки создаются лениво для каждого event loop: loop -> name -> Lock
+        # Слабые ссылки на loop: блокировки завершенного loop удаляются вместе с ним
+        self._locks: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Lock]] = weakref.WeakKeyDictionary()
+        self._locks_guard = threading.Lock()
         
         # Статистика
         self.stats = {
-            'alerts_sent': 0,
             'alerts_deduplicated': 0,
             'cache_hits': 0,
             'cache_misses': 0
@@ -74,7 +91,14 @@ class MemoryCache:
     @asynccontextmanager
     async def _lock(self, name: str):
         """Контекстный менеджер для блокировок"""
-        async with self._locks[name]:
+        loop = asyncio.get_running_loop()
+        loop_locks = self._locks.get(loop)
+        lock = loop_locks.get(name) if loop_locks is not None else None
+        if lock is None:
+            with self._locks_guard:
+                loop_locks = self._locks.setdefault(loop, {})
+                lock = loop_locks.setdefault(name, asyncio.Lock())
+        async with lock:
             yield
     
     async def load_from_db(self, db_manager) -> None:
@@ -84,6 +108,9 @@ class MemoryCache:
         # Загружаем активные пресеты
         presets = await db_manager.get_all_active_presets()
         async with self._lock('presets'):
+            # Ячейки копируются и планы рассылки пересобираются один раз на ключ
+            # после загрузки всех пресетов
+            pending: SubscriptionCells = {}
             for preset_data in presets:
                 preset = PresetData(
                     id=preset_data['id'],
@@ -95,58 +122,108 @@ class MemoryCache:
                     is_active=preset_data['is_active']
                 )
                 self.presets[preset.id] = preset
+                self._user_presets.setdefault(preset.user_id, set()).add(preset.id)
                 
                 # Добавляем в активные подписки ТОЛЬКО если активен
                 if preset.is_active:
-                    await self._add_preset_to_subscriptions(preset)
+                    self._adjust_active(preset.user_id, 1)
+                    self._add_preset_to_subscriptions(preset, pending)
                     logger.info(f"Loaded active preset {preset.id} with {len(preset.pairs)} pairs and {len(preset.intervals)} intervals")
+            self._publish_subscriptions(pending)
         
         # Загружаем газовые алерты
         gas_alerts = await db_manager.get_all_gas_alerts()
         async with self._lock('gas_alerts'):
             for alert in gas_alerts:
                 self.gas_alerts[alert['user_id']] = float(alert['threshold_gwei'])
+            self._gas_snapshot = tuple(self.gas_alerts.items())
         
         logger.info(f"Loaded {len(self.presets)} presets and {len(self.gas_alerts)} gas alerts")
         
         # Логируем общую статистику подписок
-        total_subs = 0
-        for symbol_data in self.active_subscriptions.values():
-            for interval_data in symbol_data.values():
-                total_subs += len(interval_data)
-        logger.info(f"Total active subscriptions: {total_subs}")
+        logger.info(f"Total active subscriptions: {self._total_subs}")
     
-    async def _add_preset_to_subscriptions(self, preset: PresetData) -> None:
-        """Добавление пресета в подписки (без блокировки)"""
+    def _adjust_active(self, user_id: int, delta: int) -> None:
+        """Изменение счетчиков активных пресетов (общего и пользователя)"""
+        self._active_presets += delta
+        count = self._user_active.get(user_id, 0) + delta
+        if count:
+            self._user_active[user_id] = count
+        else:
+            self._user_active.pop(user_id, None)
+    
+    def _add_preset_to_subscriptions(self, preset: PresetData, pending: SubscriptionCells) -> None:
+        """Добавление пресета в черновики ячеек подписок pending (без блокировки)"""
         for symbol in preset.pairs:
             for interval in preset.intervals:
-                self.active_subscriptions[symbol][interval][preset.user_id].append(preset.id)
+                # Интернируем ключи: сравнение со строками из WebSocket сводится к сравнению указателей
+                key = (sys.intern(symbol), sys.intern(interval))
+                users = pending.get(key)
+                if users is None:
+                    # Ячейка копируется один раз за запись, дальше черновик меняется на месте
+                    users = pending[key] = dict(self.active_subscriptions.get(key, ()))
+                
+                user_presets = users.get(preset.user_id)
+                if user_presets is None:
+                    user_presets = frozenset()
+                    self._total_subs += 1
+                
+                users[preset.user_id] = user_presets | {preset.id}
                 logger.debug(f"Added subscription: {symbol}@{interval} for user {preset.user_id}")
     
-    async def _remove_preset_from_subscriptions(self, preset: PresetData) -> None:
-        """Удаление пресета из подписок (без блокировки)"""
+    def _remove_preset_from_subscriptions(self, preset: PresetData, pending: SubscriptionCells) -> None:
+        """Удаление пресета из черновиков ячеек подписок pending (без блокировки)"""
         for symbol in preset.pairs:
             for interval in preset.intervals:
-                user_presets = self.active_subscriptions[symbol][interval].get(preset.user_id, [])
-                if preset.id in user_presets:
-                    user_presets.remove(preset.id)
+                key = (symbol, interval)
+                users = pending.get(key)
+                if users is None:
+                    current = self.active_subscriptions.get(key)
+                    if current is None:
+                        continue
+                    users = pending[key] = dict(current)
                 
-                # Удаляем пустые записи
-                if not user_presets:
-                    self.active_subscriptions[symbol][interval].pop(preset.user_id, None)
-                if not self.active_subscriptions[symbol][interval]:
-                    self.active_subscriptions[symbol].pop(interval, None)
-                if not self.active_subscriptions[symbol]:
-                    self.active_subscriptions.pop(symbol, None)
+                user_presets = users.get(preset.user_id)
+                if user_presets is None or preset.id not in user_presets:
+                    continue
+                
+                # Пустые записи не сохраняем
+                user_presets = user_presets - {preset.id}
+                if user_presets:
+                    users[preset.user_id] = user_presets
+                else:
+                    del users[preset.user_id]
+                    self._total_subs -= 1
+    
+    def _publish_subscriptions(self, pending: SubscriptionCells) -> None:
+        """Публикация черновиков ячеек подписок и пересборка их планов рассылки (по разу на ключ)"""
+        for key, users in pending.items():
+            symbol = key[0]
+            existed = key in self.active_subscriptions
+            if users:
+                self.active_subscriptions[key] = users
+                if not existed:
+                    self._symbol_refs[symbol] = self._symbol_refs.get(symbol, 0) + 1
+            elif existed:
+                del self.active_subscriptions[key]
+                if self._symbol_refs[symbol] == 1:
+                    del self._symbol_refs[symbol]
+                else:
+                    self._symbol_refs[symbol] -= 1
+            self._build_fanout(key)
     
     # Управление пресетами
     async def add_preset(self, preset: PresetData) -> None:
         """Добавление пресета в кеш"""
         async with self._lock('presets'):
             self.presets[preset.id] = preset
+            self._user_presets.setdefault(preset.user_id, set()).add(preset.id)
             
             if preset.is_active:
-                await self._add_preset_to_subscriptions(preset)
+                self._adjust_active(preset.user_id, 1)
+                pending: SubscriptionCells = {}
+                self._add_preset_to_subscriptions(preset, pending)
+                self._publish_subscriptions(pending)
                 logger.info(f"Added active preset {preset.id} to subscriptions")
     
     async def remove_preset(self, preset_id: int) -> None:
@@ -157,10 +234,20 @@ class MemoryCache:
                 return
             
             # Удаляем из активных подписок
-            await self._remove_preset_from_subscriptions(preset)
+            pending: SubscriptionCells = {}
+            self._remove_preset_from_subscriptions(preset, pending)
+            self._publish_subscriptions(pending)
+            if preset.is_active:
+                self._adjust_active(preset.user_id, -1)
             
             # Удаляем сам пресет
             del self.presets[preset_id]
+            
+            user_presets = self._user_presets.get(preset.user_id)
+            if user_presets is not None:
+                user_presets.discard(preset_id)
+                if not user_presets:
+                    del self._user_presets[preset.user_id]
             logger.info(f"Removed preset {preset_id} from cache")
     
     async def update_preset_status(self, preset_id: int, is_active: bool) -> None:
@@ -174,75 +261,96 @@ class MemoryCache:
                 return
             
             preset.is_active = is_active
+            pending: SubscriptionCells = {}
             
             if is_active:
                 # Добавляем в активные подписки
-                await self._add_preset_to_subscriptions(preset)
+                self._adjust_active(preset.user_id, 1)
+                self._add_preset_to_subscriptions(preset, pending)
                 logger.info(f"Activated preset {preset_id}")
             else:
                 # Удаляем из активных подписок
-                await self._remove_preset_from_subscriptions(preset)
+                self._adjust_active(preset.user_id, -1)
+                self._remove_preset_from_subscriptions(preset, pending)
                 logger.info(f"Deactivated preset {preset_id}")
+            self._publish_subscriptions(pending)
     
-    async def get_subscribed_users(self, symbol: str, interval: str) -> Dict[int, List[PresetData]]:
-        """Получение пользователей, подписанных на symbol/interval"""
-        async with self._lock('subscriptions'):
-            result = {}
-            user_preset_ids = self.active_subscriptions.get(symbol, {}).get(interval, {})
-            
-            logger.debug(f"Checking subscriptions for {symbol}@{interval}: {len(user_preset_ids)} users")
-            
-            for user_id, preset_ids in user_preset_ids.items():
-                user_presets = []
-                for preset_id in preset_ids:
-                    preset = self.presets.get(preset_id)
-                    if preset and preset.is_active:
-                        user_presets.append(preset)
-                
-                if user_presets:
-                    result[user_id] = user_presets
-                    logger.debug(f"User {user_id} has {len(user_presets)} active presets for {symbol}@{interval}")
-            
-            self.stats['cache_hits'] += 1
-            return result
+    def _build_fanout(self, key: Tuple[str, str]) -> None:
+        """Пересборка неизменяемого плана рассылки для ключа (при записи)"""
+        users = self.active_subscriptions.get(key)
+        if not users:
+            self._fanout.pop(key, None)
+            self._min_threshold.pop(key, None)
+            return
+        
+        get_preset = self.presets.get
+        fanout = []
+        for user_id, preset_ids in users.items():
+            # Пресеты пользователя по возрастанию порога: первый - самый низкий
+            user_presets = tuple(sorted(
+                (preset for preset in map(get_preset, preset_ids)
+                 if preset is not None and preset.is_active),
+                key=lambda preset: preset.percent_change
+            ))
+            if user_presets:
+                fanout.append((user_id, user_presets))
+        
+        # Получатели по возрастанию своего минимального порога: сработавшие
+        # пользователи образуют префикс, его длину дает bisect по порогам
+        fanout.sort(key=lambda item: item[1][0].percent_change)
+        thresholds = tuple(presets[0].percent_change for _, presets in fanout)
+        self._fanout[key] = (tuple(fanout), thresholds)
+        self._min_threshold[key] = thresholds[0] if thresholds else float('inf')
+    
+    def get_fanout(self, symbol: str, interval: str) -> Fanout:
+        """План рассылки symbol/interval: (((user_id, presets), ...), (threshold, ...))"""
+        # Синхронно, без блокировки и без аллокаций: план рассылки
+        # подготовлен писателями, чтение - один поиск в dict
+        self.stats['cache_hits'] += 1
+        return self._fanout.get((symbol, interval), _EMPTY_FANOUT)
+    
+    def get_min_threshold(self, symbol: str, interval: str) -> float:
+        """Минимальный порог среди подписчиков symbol/interval (inf если их нет)"""
+        return self._min_threshold.get((symbol, interval), float('inf'))
     
     # Управление газовыми алертами
     async def set_gas_alert(self, user_id: int, threshold_gwei: float) -> None:
         """Установка газового алерта"""
         async with self._lock('gas_alerts'):
             self.gas_alerts[user_id] = threshold_gwei
+            self._gas_snapshot = tuple(self.gas_alerts.items())
     
     async def remove_gas_alert(self, user_id: int) -> None:
         """Удаление газового алерта"""
         async with self._lock('gas_alerts'):
-            self.gas_alerts.pop(user_id, None)
+            if self.gas_alerts.pop(user_id, None) is not None:
+                self._gas_snapshot = tuple(self.gas_alerts.items())
     
-    async def get_all_gas_alerts(self) -> List[Tuple[int, float]]:
+    async def get_all_gas_alerts(self) -> Tuple[Tuple[int, float], ...]:
         """Получение всех активных газовых алертов"""
-        async with self._lock('gas_alerts'):
-            return list(self.gas_alerts.items())
-    
-    # Дедупликация алертов - УБРАНА
-    async def record_alert(self, alert: AlertRecord) -> None:
-        """Запись отправленного алерта"""
-        async with self._lock('alerts'):
-            self.alert_history.append(alert)
-            self.stats['alerts_sent'] += 1
+        # Без блокировки: писатели публикуют новый кортеж целиком
+        return self._gas_snapshot
     
     # FSM состояния
     async def set_user_state(self, user_id: int, state: str, data: Optional[Dict[str, Any]] = None) -> None:
         """Установка состояния пользователя"""
         async with self._lock('states'):
+            self.user_states.pop(user_id, None)
             self.user_states[user_id] = {
                 'state': state,
                 'data': data or {},
-                'timestamp': datetime.now()
+                'timestamp': time.monotonic()
             }
+            if len(self.user_states) > config.MAX_USER_STATES:
+                self.user_states.popitem(last=False)
     
     async def get_user_state(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Получение состояния пользователя"""
         async with self._lock('states'):
-            return self.user_states.get(user_id)
+            user_state = self.user_states.get(user_id)
+            if user_state is not None:
+                self.user_states.move_to_end(user_id)
+            return user_state
     
     async def clear_user_state(self, user_id: int) -> None:
         """Очистка состояния пользователя"""
@@ -252,33 +360,24 @@ class MemoryCache:
     # Статистика
     def get_stats(self) -> Dict[str, Any]:
         """Получение статистики кеша"""
-        total_subscriptions = 0
-        for symbol_data in self.active_subscriptions.values():
-            for interval_data in symbol_data.values():
-                total_subscriptions += len(interval_data)
-        
         return {
             **self.stats,
             'total_presets': len(self.presets),
-            'active_presets': sum(1 for p in self.presets.values() if p.is_active),
+            'active_presets': self._active_presets,
             'total_gas_alerts': len(self.gas_alerts),
-            'unique_symbols': len(self.active_subscriptions),
-            'total_subscriptions': total_subscriptions,
-            'alert_history_size': len(self.alert_history)
+            'unique_symbols': len(self._symbol_refs),
+            'total_subscriptions': self._total_subs
         }
     
     async def get_user_stats(self, user_id: int) -> Dict[str, Any]:
         """Статистика для конкретного пользователя"""
-        async with self._lock('presets'):
-            user_presets = [p for p in self.presets.values() if p.user_id == user_id]
-            active_presets = [p for p in user_presets if p.is_active]
-            
-            return {
-                'total_presets': len(user_presets),
-                'active_presets': len(active_presets),
-                'has_gas_alert': user_id in self.gas_alerts,
-                'gas_threshold': self.gas_alerts.get(user_id)
-            }
+        # Без блокировки: только чтение счетчиков, писатели пресетов не ждут
+        return {
+            'total_presets': len(self._user_presets.get(user_id, ())),
+            'active_presets': self._user_active.get(user_id, 0),
+            'has_gas_alert': user_id in self.gas_alerts,
+            'gas_threshold': self.gas_alerts.get(user_id)
+        }
 
 
 # Singleton instance
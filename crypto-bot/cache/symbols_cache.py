@@ -1,9 +1,11 @@
 import logging
-from typing import List
+import sys
+from typing import FrozenSet, List, Optional, Tuple
 from datetime import datetime
 import asyncio
 
 from services.binanceAPI.service import binance_api
+from config.settings import config
 
 logger = logging.getLogger(__name__)
 
@@ -12,47 +14,102 @@ class SymbolsCache:
     """Кеш символов в памяти - работает только с памятью после инициализации"""
     
     def __init__(self):
-        self.symbols: List[str] = []
+        self.symbols: Tuple[str, ...] = ()
+        # Множество символов для проверок за O(1)
+        self.symbol_set: FrozenSet[str] = frozenset()
         self.loaded_at: datetime = None
-        self._lock = asyncio.Lock()
+        self._init_task: Optional[asyncio.Task] = None
+        self._refresh_task: Optional[asyncio.Task] = None
         self._initialized = False
         
     async def initialize(self):
         """Одноразовая загрузка символов при старте"""
         if self._initialized:
+            # После close() символы остаются в памяти, перезапускаем только фоновое обновление
+            if self._refresh_task is None:
+                self._start_refresh()
             return
-            
-        async with self._lock:
-            if self._initialized:  # Double check
-                return
-                
-            logger.info("Initializing symbols cache...")
-            
-            # Загружаем символы из API
-            symbols = await binance_api.fetch_all_futures_symbols()
-            
-            if not symbols:
-                logger.error("Failed to load symbols from API")
-                return
-            
-            self.symbols = symbols
-            self.loaded_at = datetime.now()
-            self._initialized = True
-            
-            logger.info(f"Symbols cache initialized with {len(self.symbols)} symbols")
+        
+        # Все одновременные вызовы ждут одну и ту же загрузку
+        if self._init_task is None:
+            self._init_task = asyncio.create_task(self._do_initialize())
+        
+        try:
+            await asyncio.shield(self._init_task)
+        finally:
+            # После неудачи разрешаем повторную попытку
+            if self._init_task is not None and self._init_task.done() and not self._initialized:
+                self._init_task = None
+    
+    async def _do_initialize(self):
+        """Загрузка символов из API"""
+        logger.info("Initializing symbols cache...")
+        
+        # Загружаем символы из API
+        symbols = await binance_api.fetch_all_futures_symbols()
+        
+        if not symbols:
+            logger.error("Failed to load symbols from API")
+            return
+        
+        self._set_symbols(symbols)
+        self._initialized = True
+        
+        # Дальше список обновляется в фоне, чтения не ждут HTTP запрос
+        self._start_refresh()
+        
+        logger.info(f"Symbols cache initialized with {len(self.symbols)} symbols")
+    
+    def _set_symbols(self, symbols: List[str]):
+        """Публикация нового списка символов"""
+        # Интернируем: те же объекты строк используются ключами подписок
+        symbols = tuple(sys.intern(s) for s in symbols)
+        self.symbol_set = frozenset(symbols)
+        self.symbols = symbols
+        self.loaded_at = datetime.now()
+    
+    def _start_refresh(self):
+        """Запуск фонового обновления символов"""
+        self._refresh_task = asyncio.create_task(self._refresh_loop())
     
-    def get_all_symbols(self) -> List[str]:
-        """Получение всех символов из памяти"""
+    async def _refresh_loop(self):
+        """Периодическое фоновое обновление символов"""
+        while True:
+            await asyncio.sleep(config.SYMBOLS_REFRESH_INTERVAL)
+            try:
+                symbols = await binance_api.fetch_all_futures_symbols()
+                if symbols:
+                    self._set_symbols(symbols)
+                    logger.info(f"Symbols cache refreshed: {len(self.symbols)} symbols")
+            except Exception as e:
+                logger.error(f"Error refreshing symbols cache: {e}")
+    
+    async def close(self):
+        """Остановка фонового обновления"""
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+    
+    def get_all_symbols(self) -> Tuple[str, ...]:
+        """Получение всех символов из памяти (неизменяемый кортеж, без копирования)"""
         if not self._initialized:
             logger.warning("Symbols cache not initialized, returning empty list")
-            return []
-        return self.symbols.copy()
+            return ()
+        return self.symbols
+    
+    def contains(self, symbol: str) -> bool:
+        """Проверка символа за O(1) (до инициализации считаем любой символ валидным)"""
+        return not self._initialized or symbol in self.symbol_set
     
-    def get_top_symbols(self, limit: int = 100) -> List[str]:
+    def get_top_symbols(self, limit: int = 100) -> Tuple[str, ...]:
         """Получение топ символов из памяти"""
         if not self._initialized:
             logger.warning("Symbols cache not initialized, returning empty list")
-            return []
+            return ()
         return self.symbols[:limit]
     
     def validate_symbols(self, symbols: List[str]) -> List[str]:
@@ -60,7 +117,8 @@ class SymbolsCache:
         if not self._initialized:
             return symbols  # Возвращаем как есть если кеш не инициализирован
         
-        valid_symbols = set(self.symbols)
+        # Множество строится один раз при загрузке списка
+        valid_symbols = self.symbol_set
         return [s for s in symbols if s in valid_symbols]
     
     def get_stats(self) -> dict:
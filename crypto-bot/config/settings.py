@@ -6,9 +6,9 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Config:
-    """Централизованная конфигурация приложения"""
+    """Централизованная конфигурация приложения (неизменяемая)"""
     
     # === TELEGRAM BOT ===
     BOT_TOKEN: str = os.getenv("BOT_TOKEN", "")
@@ -27,6 +27,7 @@ class Config:
     # === GAS MONITORING ===
     GAS_CHECK_INTERVAL: int = 60  # секунд между проверками
     GAS_HISTORY_SIZE: int = 1440  # количество записей (24 часа при проверке каждую минуту)
+    GAS_TREND_WINDOW: int = 60  # минут для отображения тренда цены газа
     GAS_NOTIFICATION_COOLDOWN: int = 3600  # секунд между уведомлениями одному пользователю
     GAS_MIN_THRESHOLD: float = 0.1  # минимальный порог в Gwei
     GAS_MAX_THRESHOLD: float = 1000.0  # максимальный порог в Gwei
@@ -41,7 +42,6 @@ class Config:
     CANDLE_QUEUE_SIZE: int = 10000
     ALERT_QUEUE_SIZE: int = 5000
     BATCH_PROCESS_SIZE: int = 500
-    WORKER_THREADS: int = 4
     
     # === RATE LIMITS ===
     # Telegram API limits
@@ -60,7 +60,7 @@ class Config:
     
     # === ALERT SYSTEM ===
     ALERT_DEDUP_WINDOW: int = 60  # секунд для дедупликации алертов
-    ALERT_HISTORY_SIZE: int = 10000  # количество записей в истории
+    ALERT_DEDUP_MAX_SIZE: int = 10000  # максимум ключей в окне дедупликации
     
     # === DATABASE ===
     DATABASE_URL: str = os.getenv("DATABASE_URL", "postgresql://localhost/crypto_bot")
@@ -68,10 +68,15 @@ class Config:
     DB_MAX_OVERFLOW: int = 10
     DB_MAX_QUERIES: int = 50000
     DB_CONNECTION_TIMEOUT: int = 600  # seconds
+    DB_STATEMENT_CACHE_SIZE: int = 256  # подготовленных выражений на соединение
     
     # === CACHE ===
     CACHE_TTL: int = 3600  # 1 час
+    MAX_USER_STATES: int = 10000  # максимум FSM состояний в памяти (LRU)
+    USER_PRESETS_CACHE_TTL: float = 30.0  # секунд кеша пресетов пользователя для меню
+    USER_PRESETS_CACHE_MAX_SIZE: int = 10000  # максимум пользователей в кеше пресетов (LRU)
     SYMBOLS_CACHE_ENABLED: bool = True
+    SYMBOLS_REFRESH_INTERVAL: int = 3300  # seconds между фоновыми обновлениями символов
     
     # === MONITORING & HEALTH ===
     METRICS_PORT: int = 9090
@@ -94,6 +99,7 @@ class Config:
     # Лимиты для топ символов
     TOP_SYMBOLS_BY_VOLUME_LIMIT: int = 100
     TOP_SYMBOLS_VOLUME_LIMIT: int = 50
+    TOP_SYMBOLS_CACHE_TTL: float = 60.0  # секунд кеша топа по объему
     
     # === PERCENTAGE THRESHOLDS ===
     MIN_PERCENT_CHANGE: float = 0.1
@@ -118,7 +124,6 @@ class Config:
     QUEUE_RATE_LIMIT_WINDOW: int = 60  # seconds
     
     # === PROCESSOR SETTINGS ===
-    PROCESSOR_TIMEOUT: float = 1.0  # seconds timeout для получения свечи из очереди
     PROCESSOR_ERROR_SLEEP: float = 1.0  # seconds задержка при ошибке
     
     # === PRECISION SETTINGS ===
@@ -138,6 +143,13 @@ class Config:
     
     # === API TIMEOUT SETTINGS ===
     HTTP_REQUEST_TIMEOUT: int = 10  # seconds для обычных запросов
+    HTTP_CONNECT_TIMEOUT: float = 3.0  # seconds на подключение
+    HTTP_READ_TIMEOUT: float = 8.0  # seconds между чтениями сокета
+    HTTP_MAX_RETRIES: int = 3  # попыток при таймауте/обрыве соединения
+    HTTP_RETRY_BACKOFF: float = 0.5  # seconds базовой задержки повтора (x2 на попытку)
+    HTTP_CONNECTION_LIMIT: int = 32  # соединений в пуле HTTP клиента
+    HTTP_DNS_CACHE_TTL: int = 300  # seconds кеша DNS
+    HTTP_KEEPALIVE_TIMEOUT: float = 75.0  # seconds удержания простаивающего соединения
     WS_TEST_TIMEOUT: float = 3.0  # seconds для тестирования стримов
     WS_CONNECT_TIMEOUT: float = 5.0  # seconds для подключения к тестовому стриму
     
@@ -5,9 +5,16 @@ Crypto Bot - Многопользовательский Telegram бот для 
 
 import asyncio
 import logging
+import queue
 import signal
 import sys
-from typing import Optional
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional, Set
+
+try:
+    import uvloop  # быстрый event loop на libuv (нет под Windows)
+except ImportError:
+    uvloop = None
 
 from config.settings import config
 from services.telegram.bot import telegram_bot
@@ -15,14 +22,23 @@ from services.candle_alerts import candle_alert_service
 from services.gas_alerts import gas_alert_service
 from utils.queue import message_queue
 
-# Настройка логирования
+# Настройка логирования: event loop только кладет запись в очередь,
+# запись в stdout и файл выполняет фоновый поток QueueListener
+_log_formatter = logging.Formatter(config.LOG_FORMAT)
+_log_handlers = [
+    logging.StreamHandler(sys.stdout),
+    logging.FileHandler(config.LOG_FILE, encoding=config.LOG_FILE_ENCODING)
+]
+for _handler in _log_handlers:
+    _handler.setFormatter(_log_formatter)
+
+_log_queue = queue.SimpleQueue()
+log_listener = QueueListener(_log_queue, *_log_handlers, respect_handler_level=True)
+log_listener.start()
+
 logging.basicConfig(
     level=getattr(logging, config.LOG_LEVEL),
-    format=config.LOG_FORMAT,
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler(config.LOG_FILE, encoding=config.LOG_FILE_ENCODING)
-    ]
+    handlers=[QueueHandler(_log_queue)]
 )
 
 logger = logging.getLogger(__name__)
@@ -42,6 +58,8 @@ class CryptoBot:
             'candle_alerts': candle_alert_service,
             'gas_alerts': gas_alert_service
         }
+        # Корневые задачи приложения (отменяются при остановке)
+        self._tasks: Set[asyncio.Task] = set()
     
     async def start(self):
         """Запуск всех сервисов"""
@@ -62,13 +80,21 @@ class CryptoBot:
             
             # Сначала запускаем Telegram бота (он инициализирует БД и кеш)
             telegram_task = asyncio.create_task(telegram_bot.start())
+            self._tasks.add(telegram_task)
             
-            # Ждем немного для инициализации
-            await asyncio.sleep(3)
+            # Ждем инициализации БД и кеша (или ошибки старта бота)
+            ready_task = asyncio.create_task(telegram_bot.wait_ready())
+            self._tasks.add(ready_task)
+            await asyncio.wait({telegram_task, ready_task}, return_when=asyncio.FIRST_COMPLETED)
+            if telegram_task.done():
+                ready_task.cancel()
+                await telegram_task
             
-            # Запускаем остальные сервисы
-            await candle_alert_service.start()
-            await gas_alert_service.start()
+            # Запускаем остальные сервисы параллельно
+            await asyncio.gather(
+                candle_alert_service.start(),
+                gas_alert_service.start()
+            )
             
             logger.info("All services started successfully")
             
@@ -94,6 +120,14 @@ class CryptoBot:
         except Exception as e:
             logger.error(f"Error stopping services: {e}")
         
+        # Отменяем только свои корневые задачи: дочерние задачи сервисы останавливают сами
+        current = asyncio.current_task()
+        tasks = [task for task in self._tasks if not task.done() and task is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        
         logger.info("Crypto Bot stopped")
     
     async def health_check(self):
@@ -160,14 +194,25 @@ async def main():
     
     bot_app = CryptoBot()
     
+    # Eager-задачи (Python 3.12+): корутина выполняется сразу до первого await
+    if hasattr(asyncio, 'eager_task_factory'):
+        asyncio.get_running_loop().set_task_factory(asyncio.eager_task_factory)
+    
     # Обработчики сигналов
-    def signal_handler(sig, frame):
+    loop = asyncio.get_running_loop()
+    
+    def request_shutdown(sig):
         logger.info(f"Received signal {sig}")
         if bot_app and bot_app.running:
-            asyncio.create_task(shutdown())
+            asyncio.ensure_future(shutdown())
     
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            # Сигнал доставляется через self-pipe event loop, а не посреди корутины
+            loop.add_signal_handler(sig, request_shutdown, sig)
+        except NotImplementedError:
+            # Windows: add_signal_handler не поддерживается
+            signal.signal(sig, lambda s, frame: loop.call_soon_threadsafe(request_shutdown, s))
     
     try:
         await bot_app.start()
@@ -185,22 +230,21 @@ async def shutdown():
     if bot_app:
         await bot_app.stop()
     
-    # Отменяем все задачи
-    tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
-    for task in tasks:
-        task.cancel()
-    
-    await asyncio.gather(*tasks, return_exceptions=True)
-    
     # Останавливаем event loop
     asyncio.get_event_loop().stop()
 
 
 if __name__ == "__main__":
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
+    finally:
+        # Дописываем оставшиеся в очереди записи лога
+        log_listener.stop()
\ No newline at end of file
@@ -1,57 +1,14 @@
-from sqlalchemy import create_engine, Column, BigInteger, String, Boolean, DECIMAL, ARRAY, ForeignKey, TIMESTAMP
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
-from sqlalchemy.sql import func
-from sqlalchemy.pool import QueuePool
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict
 import asyncio
+import logging
+import time
 from asyncpg import create_pool
 import asyncpg
 
 from config.settings import config
 
-Base = declarative_base()
-
-
-class User(Base):
-    """Модель пользователя"""
-    __tablename__ = 'users'
-    
-    user_id = Column(BigInteger, primary_key=True)
-    is_active = Column(Boolean, default=True)
-    created_at = Column(TIMESTAMP, server_default=func.now())
-    
-    # Relationships
-    presets = relationship("Preset", back_populates="user", cascade="all, delete-orphan")
-    gas_alert = relationship("GasAlert", back_populates="user", uselist=False, cascade="all, delete-orphan")
-
-
-class Preset(Base):
-    """Модель пресета для свечных алертов"""
-    __tablename__ = 'presets'
-    
-    id = Column(BigInteger, primary_key=True)
-    user_id = Column(BigInteger, ForeignKey('users.user_id', ondelete='CASCADE'))
-    name = Column(String(100), nullable=False)
-    pairs = Column(ARRAY(String), nullable=False)
-    intervals = Column(ARRAY(String), nullable=False)
-    percent_change = Column(DECIMAL(5, 2), nullable=False)
-    is_active = Column(Boolean, default=False)
-    created_at = Column(TIMESTAMP, server_default=func.now())
-    
-    # Relationships
-    user = relationship("User", back_populates="presets")
-
-
-class GasAlert(Base):
-    """Модель газовых пресетов"""
-    __tablename__ = 'gas_alerts'
-    
-    user_id = Column(BigInteger, ForeignKey('users.user_id', ondelete='CASCADE'), primary_key=True)
-    threshold_gwei = Column(DECIMAL(10, 2), nullable=False)
-    
-    # Relationships
-    user = relationship("User", back_populates="gas_alert")
+logger = logging.getLogger(__name__)
 
 
 class DatabaseManager:
@@ -59,6 +16,12 @@ class DatabaseManager:
     
     def __init__(self):
         self.pool: Optional[asyncpg.Pool] = None
+        # Кеш пресетов пользователя для меню: user_id -> (время загрузки, пресеты)
+        # LRU: самые давно использованные в начале, вытесняются сверх USER_PRESETS_CACHE_MAX_SIZE
+        self._user_presets_cache: OrderedDict[int, Tuple[float, List[asyncpg.Record]]] = OrderedDict()
+        # Загрузки пресетов в процессе: user_id -> [число загрузок, поколение]
+        # Инвалидация повышает поколение, и загрузка, начатая до записи, не кладет в кеш старые строки
+        self._user_presets_fetches: Dict[int, List[int]] = {}
         
     async def init(self):
         """Инициализация пула соединений"""
@@ -67,7 +30,11 @@ class DatabaseManager:
             min_size=10,
             max_size=config.DB_POOL_SIZE,
             max_queries=config.DB_MAX_QUERIES,
-max_inactive_connection_lifetime=config.DB_CONNECTION_TIMEOUT,
+            max_inactive_connection_lifetime=config.DB_CONNECTION_TIMEOUT,
+            # Встроенный кеш подготовленных выражений asyncpg: все запросы
+            # менеджера - константный текст, готовятся один раз на соединение
+            statement_cache_size=config.DB_STATEMENT_CACHE_SIZE,
+            max_cached_statement_lifetime=0,
         )
         await self._create_tables()
     
@@ -77,41 +44,36 @@ max_inactive_connection_lifetime=config.DB_CONNECTION_TIMEOUT,
             await self.pool.close()
     
     async def _create_tables(self):
-        """Создание таблиц если их нет"""
+        """Создание таблиц если их нет (одним запросом в транзакции)"""
         async with self.pool.acquire() as conn:
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id BIGINT PRIMARY KEY,
-                    is_active BOOLEAN DEFAULT true,
-                    created_at TIMESTAMP DEFAULT NOW()
-                )
-            ''')
-            
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS presets (
-                    id BIGSERIAL PRIMARY KEY,
-                    user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
-                    name VARCHAR(100) NOT NULL,
-                    pairs TEXT[] NOT NULL,
-                    intervals TEXT[] NOT NULL,
-                    percent_change DECIMAL(5,2) NOT NULL,
-                    is_active BOOLEAN DEFAULT false,
-                    created_at TIMESTAMP DEFAULT NOW()
-                )
-            ''')
-            
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS gas_alerts (
-                    user_id BIGINT PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
-                    threshold_gwei DECIMAL(10,2) NOT NULL
-                )
-            ''')
-            
-            # Создаем индексы для оптимизации
-            await conn.execute('''
-                CREATE INDEX IF NOT EXISTS idx_presets_user_active 
-                ON presets(user_id, is_active)
-            ''')
+            async with conn.transaction():
+                await conn.execute('''
+                    CREATE TABLE IF NOT EXISTS users (
+                        user_id BIGINT PRIMARY KEY,
+                        is_active BOOLEAN DEFAULT true,
+                        created_at TIMESTAMP DEFAULT NOW()
+                    );
+                    
+                    CREATE TABLE IF NOT EXISTS presets (
+                        id BIGSERIAL PRIMARY KEY,
+                        user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
+                        name VARCHAR(100) NOT NULL,
+                        pairs TEXT[] NOT NULL,
+                        intervals TEXT[] NOT NULL,
+                        percent_change DECIMAL(5,2) NOT NULL,
+                        is_active BOOLEAN DEFAULT false,
+                        created_at TIMESTAMP DEFAULT NOW()
+                    );
+                    
+                    CREATE TABLE IF NOT EXISTS gas_alerts (
+                        user_id BIGINT PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
+                        threshold_gwei DECIMAL(10,2) NOT NULL
+                    );
+                    
+                    -- Индексы для оптимизации
+                    CREATE INDEX IF NOT EXISTS idx_presets_user_active 
+                    ON presets(user_id, is_active);
+                ''')
     
     # User operations
     async def create_user(self, user_id: int) -> bool:
@@ -124,17 +86,17 @@ max_inactive_connection_lifetime=config.DB_CONNECTION_TIMEOUT,
                 )
                 return True
             except Exception as e:
-                print(f"Error creating user: {e}")
+                logger.error(f"Error creating user: {e}")
                 return False
     
-    async def get_user(self, user_id: int) -> Optional[dict]:
+    async def get_user(self, user_id: int) -> Optional[asyncpg.Record]:
         """Получение пользователя"""
         async with self.pool.acquire() as conn:
             row = await conn.fetchrow(
                 'SELECT * FROM users WHERE user_id = $1',
                 user_id
             )
-            return dict(row) if row else None
+            return row
     
     # Preset operations
     async def create_preset(self, user_id: int, name: str, pairs: List[str], 
@@ -147,65 +109,114 @@ max_inactive_connection_lifetime=config.DB_CONNECTION_TIMEOUT,
                        VALUES ($1, $2, $3, $4, $5, $6) RETURNING id''',
                     user_id, name, pairs, intervals, percent_change, is_active
                 )
+                self._invalidate_user_presets(user_id)
                 return row['id']
             except Exception as e:
-                print(f"Error creating preset: {e}")
+                logger.error(f"Error creating preset: {e}")
                 return None
     
-    async def get_user_presets(self, user_id: int) -> List[dict]:
-        """Получение всех пресетов пользователя"""
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch(
-                'SELECT * FROM presets WHERE user_id = $1 ORDER BY created_at DESC',
-                user_id
-            )
-            return [dict(row) for row in rows]
+    async def get_user_presets(self, user_id: int) -> List[asyncpg.Record]:
+        """Получение всех пресетов пользователя (с коротким TTL кешем)"""
+        cached = self._user_presets_cache.get(user_id)
+        if cached is not None:
+            if time.monotonic() - cached[0] < config.USER_PRESETS_CACHE_TTL:
+                self._user_presets_cache.move_to_end(user_id)
+                return cached[1]
+            del self._user_presets_cache[user_id]
+        
+        fetch = self._user_presets_fetches.get(user_id)
+        if fetch is None:
+            fetch = self._user_presets_fetches[user_id] = [0, 0]
+        fetch[0] += 1
+        generation = fetch[1]
+        try:
+            async with self.pool.acquire() as conn:
+                presets = await conn.fetch(
+                    'SELECT * FROM presets WHERE user_id = $1 ORDER BY created_at DESC',
+                    user_id
+                )
+        finally:
+            fetch[0] -= 1
+            if not fetch[0]:
+                del self._user_presets_fetches[user_id]
+        
+        # Пока шел запрос, пресеты пользователя изменились: результат мог устареть
+        if fetch[1] == generation:
+            self._store_user_presets(user_id, presets)
+        return presets
+    
+    def _invalidate_user_presets(self, user_id: int) -> None:
+        """Сброс кеша пресетов пользователя после записи"""
+        self._user_presets_cache.pop(user_id, None)
+        fetch = self._user_presets_fetches.get(user_id)
+        if fetch is not None:
+            fetch[1] += 1
     
-    async def get_preset(self, preset_id: int) -> Optional[dict]:
+    def _store_user_presets(self, user_id: int, presets: List[asyncpg.Record]) -> None:
+        """Запись в LRU кеш пресетов с вытеснением устаревших и лишних записей"""
+        cache = self._user_presets_cache
+        now = time.monotonic()
+        cache.pop(user_id, None)
+        cache[user_id] = (now, presets)
+        
+        # Устаревшие записи в начале вытесняем сразу, не дожидаясь чтения
+        cutoff = now - config.USER_PRESETS_CACHE_TTL
+        while cache:
+            loaded_at, _ = next(iter(cache.values()))
+            if loaded_at > cutoff:
+                break
+            cache.popitem(last=False)
+        
+        if len(cache) > config.USER_PRESETS_CACHE_MAX_SIZE:
+            cache.popitem(last=False)
+    
+    async def get_preset(self, preset_id: int) -> Optional[asyncpg.Record]:
         """Получение пресета по ID"""
         async with self.pool.acquire() as conn:
             row = await conn.fetchrow(
                 'SELECT * FROM presets WHERE id = $1',
                 preset_id
             )
-            return dict(row) if row else None
+            return row
     
     async def update_preset_status(self, preset_id: int, is_active: bool) -> bool:
         """Обновление статуса пресета"""
         async with self.pool.acquire() as conn:
             try:
-                await conn.execute(
-                    'UPDATE presets SET is_active = $1 WHERE id = $2',
+                user_id = await conn.fetchval(
+                    'UPDATE presets SET is_active = $1 WHERE id = $2 RETURNING user_id',
                     is_active, preset_id
                 )
+                self._invalidate_user_presets(user_id)
                 return True
             except Exception as e:
-                print(f"Error updating preset status: {e}")
+                logger.error(f"Error updating preset status: {e}")
                 return False
     
     async def delete_preset(self, preset_id: int) -> bool:
         """Удаление пресета"""
         async with self.pool.acquire() as conn:
             try:
-                await conn.execute(
-                    'DELETE FROM presets WHERE id = $1',
+                user_id = await conn.fetchval(
+                    'DELETE FROM presets WHERE id = $1 RETURNING user_id',
                     preset_id
                 )
+                self._invalidate_user_presets(user_id)
                 return True
             except Exception as e:
-                print(f"Error deleting preset: {e}")
+                logger.error(f"Error deleting preset: {e}")
                 return False
     
-    async def get_all_active_presets(self) -> List[dict]:
-        """Получение всех активных пресетов для загрузки в кеш"""
+    async def get_all_active_presets(self) -> List[asyncpg.Record]:
+        """Получение всех активных пресетов для загрузки в кеш (только нужные кешу колонки)"""
         async with self.pool.acquire() as conn:
             rows = await conn.fetch(
-                '''SELECT p.*, u.user_id 
+                '''SELECT p.id, p.user_id, p.name, p.pairs, p.intervals, p.percent_change, p.is_active
                    FROM presets p 
                    JOIN users u ON p.user_id = u.user_id 
                    WHERE p.is_active = true AND u.is_active = true'''
             )
-            return [dict(row) for row in rows]
+            return rows
     
     # Gas alert operations
     async def set_gas_alert(self, user_id: int, threshold_gwei: float) -> bool:
@@ -221,17 +232,17 @@ max_inactive_connection_lifetime=config.DB_CONNECTION_TIMEOUT,
                 )
                 return True
             except Exception as e:
-                print(f"Error setting gas alert: {e}")
+                logger.error(f"Error setting gas alert: {e}")
                 return False
     
-    async def get_gas_alert(self, user_id: int) -> Optional[dict]:
+    async def get_gas_alert(self, user_id: int) -> Optional[asyncpg.Record]:
         """Получение газового пресета пользователя"""
         async with self.pool.acquire() as conn:
             row = await conn.fetchrow(
                 'SELECT * FROM gas_alerts WHERE user_id = $1',
                 user_id
             )
-            return dict(row) if row else None
+            return row
     
     async def delete_gas_alert(self, user_id: int) -> bool:
         """ПОЛНОЕ удаление газового пресета"""
@@ -243,10 +254,10 @@ max_inactive_connection_lifetime=config.DB_CONNECTION_TIMEOUT,
                 )
                 return True
             except Exception as e:
-                print(f"Error deleting gas alert: {e}")
+                logger.error(f"Error deleting gas alert: {e}")
                 return False
     
-    async def get_all_gas_alerts(self) -> List[dict]:
+    async def get_all_gas_alerts(self) -> List[asyncpg.Record]:
         """Получение ВСЕХ газовых пресетов (все по определению активны)"""
         async with self.pool.acquire() as conn:
             rows = await conn.fetch(
@@ -255,7 +266,7 @@ max_inactive_connection_lifetime=config.DB_CONNECTION_TIMEOUT,
                    JOIN users u ON g.user_id = u.user_id 
                    WHERE u.is_active = true'''
             )
-            return [dict(row) for row in rows]
+            return rows
 
 
 # Singleton instance
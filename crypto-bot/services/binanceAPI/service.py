@@ -1,6 +1,9 @@
 import aiohttp
 import logging
-from typing import List, Optional
+import numpy as np
+import orjson
+import time
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 import asyncio
 
@@ -16,12 +19,35 @@ class BinanceAPIClient:
         self.session: Optional[aiohttp.ClientSession] = None
         self._initialized = False
         
+        # Кеш топа по объему: limit -> (время загрузки, символы)
+        self._top_cache: Dict[int, Tuple[float, List[str]]] = {}
+        # Запросы в полете: limit -> задача, общая для всех ожидающих
+        self._top_inflight: Dict[int, asyncio.Task] = {}
+        
     async def initialize(self):
         """Инициализация клиента"""
         if self._initialized:
             return
             
-        self.session = aiohttp.ClientSession()
+        # Одна сессия с keep-alive и DNS кешем: TLS рукопожатие не повторяется на каждый запрос
+        connector = aiohttp.TCPConnector(
+            limit=config.HTTP_CONNECTION_LIMIT,
+            limit_per_host=config.HTTP_CONNECTION_LIMIT,
+            ttl_dns_cache=config.HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=config.HTTP_KEEPALIVE_TIMEOUT,
+            enable_cleanup_closed=True
+        )
+        self.session = aiohttp.ClientSession(
+            base_url=config.BINANCE_REST_URL,
+            connector=connector,
+            # Раздельные таймауты: зависшее подключение обрывается быстро и повторяется,
+            # медленное чтение большого ответа ограничено отдельно
+            timeout=aiohttp.ClientTimeout(
+                total=config.HTTP_REQUEST_TIMEOUT,
+                connect=config.HTTP_CONNECT_TIMEOUT,
+                sock_read=config.HTTP_READ_TIMEOUT
+            )
+        )
         self._initialized = True
         
     async def close(self):
@@ -30,6 +56,28 @@ class BinanceAPIClient:
             await self.session.close()
             self._initialized = False
             
+    async def _get_json(self, path: str) -> Optional[Any]:
+        """GET запрос к REST API с повтором при таймауте или обрыве соединения"""
+        retries = config.HTTP_MAX_RETRIES
+        for attempt in range(retries):
+            try:
+                async with self.session.get(path) as response:
+                    if response.status != 200:
+                        logger.error(f"Failed to fetch {path}. Status: {response.status}")
+                        return None
+                    
+                    # Ответы весят до 1-2 МБ: orjson разбирает их в разы быстрее json
+                    return orjson.loads(await response.read())
+                    
+            except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+                if attempt + 1 >= retries:
+                    raise
+                # Экспоненциальная задержка перед повтором
+                delay = config.HTTP_RETRY_BACKOFF * (2 ** attempt)
+                logger.warning(f"Request {path} failed ({type(e).__name__}), retrying in {delay}s")
+                await asyncio.sleep(delay)
+        return None
+    
     async def fetch_all_futures_symbols(self) -> List[str]:
         """Получение всех активных USDT фьючерсных пар с Binance"""
         if not self._initialized:
@@ -40,36 +88,47 @@ class BinanceAPIClient:
                 return []
                 
             # Используем exchangeInfo для получения только торгуемых пар
-            url = f"{config.BINANCE_REST_URL}/fapi/v1/exchangeInfo"
+            data = await self._get_json("/fapi/v1/exchangeInfo")
+            if data is None:
+                return []
+            
+            # Извлекаем только активные USDT пары за один проход: дешевые
+            # сравнения полей идут первыми, проверка суффикса строки - последней
+            quote = config.SYMBOL_FILTER_QUOTE
+            status = config.SYMBOL_FILTER_STATUS
+            contract_type = config.SYMBOL_FILTER_CONTRACT_TYPE
+            symbols = [
+                symbol_info['symbol']
+                for symbol_info in data.get('symbols', ())
+                if symbol_info.get('contractType') == contract_type
+                and symbol_info.get('status') == status
+                and symbol_info.get('symbol', '').endswith(quote)
+            ]
+            
+            logger.info(f"Fetched {len(symbols)} active perpetual USDT futures symbols from API")
+            return symbols
             
-            async with self.session.get(url, timeout=10) as response:
-                if response.status != 200:
-                    logger.error(f"Failed to fetch exchange info. Status: {response.status}")
-                    return []
-                    
-                data = await response.json()
-                
-                # Извлекаем только активные USDT пары
-                symbols = []
-                for symbol_info in data.get('symbols', []):
-                    symbol = symbol_info.get('symbol', '')
-                    status = symbol_info.get('status', '')
-                    
-                    # Только активные USDT пары
-                    if (symbol.endswith('USDT') and 
-                        status == 'TRADING' and
-                        symbol_info.get('contractType') == 'PERPETUAL'):
-                        symbols.append(symbol)
-                
-                logger.info(f"Fetched {len(symbols)} active perpetual USDT futures symbols from API")
-                return symbols
-                
         except Exception as e:
             logger.error(f"Error fetching symbols from Binance: {e}")
             return []
             
     async def fetch_top_symbols_by_volume(self, limit: int = 100) -> List[str]:
-        """Получение топ символов по объему"""
+        """Получение топ символов по объему (с TTL кешем и одним запросом на всех)"""
+        cached = self._top_cache.get(limit)
+        if cached is not None and time.monotonic() - cached[0] < config.TOP_SYMBOLS_CACHE_TTL:
+            return cached[1]
+        
+        # Одновременные промахи кеша ждут один и тот же HTTP запрос
+        task = self._top_inflight.get(limit)
+        if task is None:
+            task = asyncio.create_task(self._fetch_top_symbols_by_volume(limit))
+            self._top_inflight[limit] = task
+            task.add_done_callback(lambda _: self._top_inflight.pop(limit, None))
+        # shield: отмена одного ожидающего не отменяет общий запрос
+        return await asyncio.shield(task)
+    
+    async def _fetch_top_symbols_by_volume(self, limit: int) -> List[str]:
+        """Запрос топ символов по объему к API"""
         if not self._initialized:
             await self.initialize()
             
@@ -77,27 +136,34 @@ class BinanceAPIClient:
             if not self.session:
                 return []
                 
-            url = f"{config.BINANCE_REST_URL}/fapi/v1/ticker/24hr"
+            data = await self._get_json("/fapi/v1/ticker/24hr")
+            if data is None:
+                return []
+            
+            if limit <= 0 or not data:
+                return []
+            
+            # Колонки символов и объемов: фильтр и отбор топа выполняет numpy
+            symbols = np.array([item['symbol'] for item in data], dtype=object)
+            volumes = np.fromiter(
+                (float(item['quoteVolume']) for item in data),
+                dtype=np.float64,
+                count=len(data)
+            )
+            mask = np.char.endswith(symbols.astype(np.str_), config.SYMBOL_FILTER_QUOTE)
+            symbols, volumes = symbols[mask], volumes[mask]
+            
+            # Топ по объему (quoteVolume): argpartition за O(N), сортируется только топ
+            if limit < len(volumes):
+                top = np.argpartition(-volumes, limit)[:limit]
+            else:
+                top = np.arange(len(volumes))
+            top = top[np.argsort(-volumes[top], kind='stable')]
+            
+            top_symbols = symbols[top].tolist()
+            self._top_cache[limit] = (time.monotonic(), top_symbols)
+            return top_symbols
             
-            async with self.session.get(url, timeout=10) as response:
-                if response.status != 200:
-                    logger.error(f"Failed to fetch tickers. Status: {response.status}")
-                    return []
-                    
-                data = await response.json()
-                usdt_pairs = [
-                    item for item in data
-                    if item['symbol'].endswith('USDT')
-                ]
-                
-                # Сортируем по объему (quoteVolume)
-                usdt_pairs.sort(
-                    key=lambda x: float(x['quoteVolume']),
-                    reverse=True
-                )
-                
-                return [pair['symbol'] for pair in usdt_pairs[:limit]]
-                
         except Exception as e:
             logger.error(f"Error fetching top symbols: {e}")
             return []
@@ -1,9 +1,10 @@
 from .service import candle_alert_service
 from .processor import CandleProcessor
-from .websocket import BinanceWebSocketManager
+from .websocket import BinanceWebSocketManager, Candle
 
 __all__ = [
     'candle_alert_service',
     'CandleProcessor',
-    'BinanceWebSocketManager'
+    'BinanceWebSocketManager',
+    'Candle'
 ]
\ No newline at end of file
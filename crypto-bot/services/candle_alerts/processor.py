@@ -1,10 +1,16 @@
 import asyncio
+import bisect
 import logging
+import time
 from typing import Dict, List, Any, Tuple, Optional
-from datetime import datetime
+from collections import deque
 
-from cache.memory import cache, AlertRecord
+import numpy as np
+
+from cache.memory import cache, Fanout
 from config.settings import config
+from services.candle_alerts.websocket import Candle
+from utils.queue import message_queue
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +26,16 @@ class PriceAnalyzer:
         
         # Округляем до 4 знаков после запятой
         return round(change, 4)
+    
+    def calculate_changes(self, opens: np.ndarray, closes: np.ndarray,
+                          out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Векторный расчет процентов изменения для пачки свечей (в out, если задан)"""
+        zero = opens == 0
+        changes = np.subtract(closes, opens, out=out)
+        np.divide(changes, opens, out=changes, where=~zero)
+        changes[zero] = 0.0
+        changes *= 100
+        return np.round(changes, 4, out=changes)
 
 
 class CandleProcessor:
@@ -27,23 +43,42 @@ class CandleProcessor:
     
     def __init__(self):
         self.analyzer = PriceAnalyzer()
-        self.candle_queue = asyncio.Queue(maxsize=config.CANDLE_QUEUE_SIZE)
+        # Очередь свечей: deque + Event вместо asyncio.Queue - пачка забирается
+        # целиком, без get_nowait() и task_done() на каждую свечу
+        self.candle_queue: deque = deque()
+        self._candles_ready = asyncio.Event()
+        self._queue_limit = config.CANDLE_QUEUE_SIZE
         self.processing = False
+        # Единственный потребитель очереди (отменяется в stop)
+        self._consumer: Optional[asyncio.Task] = None
+        
+        # Горячие параметры конфига читаем один раз
+        self._batch_size = config.BATCH_PROCESS_SIZE
+        
+        # Предвыделенные колонки пачки: заполняются на месте, без новых массивов на пачку
+        # (используются только до первого await в _process_batch)
+        self._batch_opens = np.empty(self._batch_size, dtype=np.float64)
+        self._batch_closes = np.empty(self._batch_size, dtype=np.float64)
+        self._batch_changes = np.empty(self._batch_size, dtype=np.float64)
+        self._batch_thresholds = np.empty(self._batch_size, dtype=np.float64)
         
-        # Cooldown для дедупликации
-        self._cooldown = {}
-        self._cooldown_lock = asyncio.Lock()
+        # Cooldown для дедупликации: key -> время истечения (monotonic, нс)
+        self._cooldown: Dict[Tuple[str, str, int], int] = {}
+        # Очередь (expiry, key) в порядке добавления для амортизированной очистки
+        self._cooldown_expiry: deque = deque()
+        self._cooldown_window_ns = config.ALERT_DEDUP_WINDOW * 1_000_000_000
+        self._cooldown_max_size = config.ALERT_DEDUP_MAX_SIZE
         
         # Хранение последних данных по биткоину для корреляции
-        self.btc_data = {}  # interval -> {'price': float, 'change': float, 'timestamp': datetime}
-        self._btc_lock = asyncio.Lock()
-        
-        # Статистика
-        self.stats = {
-            'candles_processed': 0,
-            'alerts_generated': 0,
-            'queue_size': 0
-        }
+        self.btc_data: Dict[str, Tuple[float, float, int]] = {}  # interval -> (price, change, monotonic_ns)
+        self._btc_max_age_ns = 300 * 1_000_000_000  # данные BTC не старше 5 минут
+        # interval -> {price_change: строка корреляции}, сбрасывается при обновлении BTC
+        self._btc_correlation_memo: Dict[str, Dict[float, str]] = {}
+        
+        # Статистика: счетчики-атрибуты, словарь собирается только в get_stats
+        self.candles_processed = 0
+        self.alerts_generated = 0
+        self.candles_dropped = 0
     
     async def start(self):
         """Запуск обработчика"""
@@ -53,87 +88,129 @@ class CandleProcessor:
         self.processing = True
         logger.info("Starting candle processor...")
         
-        # Запускаем обработчики
-        for i in range(config.WORKER_THREADS):
-            asyncio.create_task(self._process_loop(i))
+        # Один потребитель: на одном event loop несколько обработчиков не работают
+        # параллельно, а лишь множат пробуждения очереди
+        self._consumer = asyncio.create_task(self._process_loop())
         
-        logger.info(f"Started {config.WORKER_THREADS} processing workers")
+        logger.info("Started candle consumer")
     
     async def stop(self):
         """Остановка обработчика"""
         logger.info("Stopping candle processor...")
         self.processing = False
         
-        # Ждем обработки оставшихся свечей
-        await self.candle_queue.join()
+        # Будим потребителя: он дорабатывает оставшиеся свечи и завершается сам
+        if self._consumer:
+            self._candles_ready.set()
+            await self._consumer
+            self._consumer = None
         
         logger.info("Candle processor stopped")
     
-    async def add_candle(self, candle: Dict[str, Any]):
+    async def add_candle(self, candle: Candle):
         """Добавление свечи в очередь обработки"""
-        try:
-            # Добавляем только закрытые свечи
-            if not candle.get('is_closed', False):
-                return
-            
-            logger.debug(f"Adding closed candle to queue: {candle['symbol']} {candle['interval']}")
-            await self.candle_queue.put(candle)
-            self.stats['queue_size'] = self.candle_queue.qsize()
-            
-        except asyncio.QueueFull:
-            logger.warning("Candle queue is full, dropping candle")
+        # Добавляем только закрытые свечи
+        if not candle.is_closed:
+            return
+        
+        if len(self.candle_queue) >= self._queue_limit:
+            # Не блокируем чтение WebSocket, предупреждаем раз в 1000 потерь
+            self.candles_dropped += 1
+            if self.candles_dropped % 1000 == 1:
+                logger.warning(f"Candle queue is full, dropping candles ({self.candles_dropped} dropped)")
+            return
+        
+        logger.debug(f"Adding closed candle to queue: {candle.symbol} {candle.interval}")
+        self.candle_queue.append(candle)
+        self._candles_ready.set()
     
-    async def _process_loop(self, worker_id: int):
-        """Основной цикл обработки свечей"""
-        logger.info(f"Worker {worker_id} started")
+    async def _process_loop(self):
+        """Основной цикл обработки свечей (единственный потребитель очереди)"""
         
-        while self.processing:
+        # Атрибуты, нужные на каждой итерации, связываем с локальными именами один раз
+        queue = self.candle_queue
+        popleft = queue.popleft
+        ready = self._candles_ready
+        batch_size = self._batch_size
+        process_batch = self._process_batch
+        
+        # Потребитель спит на Event до прихода свечи, без опроса по таймауту;
+        # после stop() дорабатывает очередь и завершается
+        while True:
             try:
-                # Ждем свечу
-                try:
-                    candle = await asyncio.wait_for(
-                        self.candle_queue.get(),
-                        timeout=config.PROCESSOR_TIMEOUT
-                    )
-                except asyncio.TimeoutError:
+                await ready.wait()
+                
+                if not queue:
+                    ready.clear()
+                    if not self.processing:
+                        break
                     continue
                 
-                # Обрабатываем свечу
-                await self._process_candle(candle)
+                # Забираем накопившиеся свечи пачкой: целиком, если помещаются
+                if len(queue) <= batch_size:
+                    batch = list(queue)
+                    queue.clear()
+                else:
+                    batch = [popleft() for _ in range(batch_size)]
                 
-                # Помечаем задачу как выполненную
-                self.candle_queue.task_done()
-                self.stats['candles_processed'] += 1
+                await process_batch(batch)
+                self.candles_processed += len(batch)
                 
             except Exception as e:
-                logger.error(f"Error in worker {worker_id}: {e}")
+                logger.error(f"Error in candle consumer: {e}")
                 await asyncio.sleep(1)
     
-    async def _process_candle(self, candle: Dict[str, Any]):
-        """Обработка одной свечи"""
-        symbol = candle['symbol']
-        interval = candle['interval']
+    async def _process_batch(self, batch: List[Candle]):
+        """Обработка пачки свечей"""
+        # Проценты изменения считаем одним векторным проходом по пачке
+        count = len(batch)
+        opens = self._batch_opens[:count]
+        closes = self._batch_closes[:count]
+        thresholds = self._batch_thresholds[:count]
+        get_min_threshold = cache.get_min_threshold
+        for k, candle in enumerate(batch):
+            opens[k] = candle.open
+            closes[k] = candle.close
+            thresholds[k] = get_min_threshold(candle.symbol, candle.interval)
+        changes_arr = self.analyzer.calculate_changes(opens, closes, out=self._batch_changes[:count])
         
-        logger.debug(f"Processing candle: {symbol} {interval}")
+        # Маска срабатываний всей пачки: изменение не ниже минимального порога подписчиков
+        triggered = (np.abs(changes_arr) >= thresholds).tolist()
+        changes = changes_arr.tolist()
         
-        # Рассчитываем процент изменения
-        price_change = self.analyzer.calculate_change(
-            candle['open'],
-            candle['close']
-        )
+        # Часы читаем один раз на пачку: для cooldown и свежести данных BTC
+        now_ns = time.monotonic_ns()
         
-        # Обновляем данные биткоина если это BTCUSDT
-        if symbol == 'BTCUSDT':
-            async with self._btc_lock:
-                self.btc_data[interval] = {
-                    'price': candle['close'],
-                    'change': price_change,
-                    'timestamp': datetime.now()
-                }
-            logger.debug(f"Updated BTC data for {interval}: {price_change:.3f}%")
+        # Группируем сработавшие свечи по (symbol, interval): подписчики ищутся один раз на группу
+        groups: Dict[Tuple[str, str], List[Tuple[Candle, float]]] = {}
+        for candle, price_change, hit in zip(batch, changes, triggered):
+            # Данные биткоина обновляем по каждой свече BTCUSDT, даже без алертов
+            if candle.symbol == 'BTCUSDT':
+                self._update_btc_data(candle.interval, candle.close, price_change, now_ns)
+            if hit:
+                groups.setdefault((candle.symbol, candle.interval), []).append((candle, price_change))
+        
+        # Алерты всей пачки копим и отправляем в очередь одним вызовом
+        alerts_to_send: List[Tuple[int, str]] = []
+        
+        for (symbol, interval), group in groups.items():
+            fanout = cache.get_fanout(symbol, interval)
+            for candle, price_change in group:
+                self._process_candle(candle, price_change, fanout, alerts_to_send, now_ns)
+        
+        if alerts_to_send:
+            await message_queue.add_candle_alerts(alerts_to_send)
+            self.alerts_generated += len(alerts_to_send)
+    
+    def _process_candle(self, candle: Candle, price_change: float, fanout: Fanout,
+                        alerts_to_send: List[Tuple[int, str]], now_ns: int):
+        """Обработка сработавшей свечи: готовые алерты добавляются в alerts_to_send пачки"""
+        # Получатели и их пороги - из одной ячейки кеша, одного поколения
+        subscribed_users, thresholds = fanout
+        symbol = candle.symbol
+        interval = candle.interval
         
-        # Получаем подписанных пользователей из кеша
-        subscribed_users = await cache.get_subscribed_users(symbol, interval)
+        logger.debug(f"Processing candle: {symbol} {interval}")
         
         if not subscribed_users:
             logger.debug(f"No subscribers for {symbol} {interval}")
@@ -143,127 +220,138 @@ class CandleProcessor:
         
         logger.debug(f"{symbol} {interval} price change: {price_change}%")
         
+        # Порог уже проверен маской пачки: изменение не ниже минимального порога подписчиков
+        abs_change = abs(price_change)
+        
         # Проверяем дедупликацию
-        if not await self._should_send_alert(symbol, interval, price_change):
+        if not self._should_send_alert(symbol, interval, price_change, now_ns):
             logger.debug(f"Alert deduplicated for {symbol} {interval} {price_change}%")
             return
         
         # Получаем корреляцию с биткоином
-        btc_correlation = await self._get_btc_correlation(symbol, interval, price_change)
+        btc_correlation = self._get_btc_correlation(symbol, interval, price_change, now_ns)
+        
+        # Текст алерта не зависит от пользователя: форматируем один раз
+        direction = "🟢" if price_change > 0 else "🔴"
+        alert_text = f"{direction} {symbol} {interval}: {abs_change:.3f}% (${candle.close})"
+        
+        # Добавляем корреляцию с BTC если есть
+        if btc_correlation:
+            alert_text += f"\n{btc_correlation}"
+        
+        # Получатели отсортированы по минимальному порогу: сработавшие - это
+        # префикс длины bisect_right, остальных пользователей не перебираем
+        triggered = bisect.bisect_right(thresholds, abs_change)
         
         # Генерируем готовые алерты
-        alerts_to_send = []
+        alerts_before = len(alerts_to_send)
+        add_alert = alerts_to_send.append
         
-        for user_id, presets in subscribed_users.items():
-            # Проверяем пресеты пока не найдем первый подходящий
-            alert_sent = False
-            
-            for preset in presets:
-                # Проверяем порог
-                if abs(price_change) >= preset.percent_change:
-                    logger.info(f"Alert triggered for user {user_id}: {symbol} {interval} {price_change:.3f}% >= {preset.percent_change}%")
-                    
-                    # ФОРМАТИРУЕМ алерт с корреляцией
-                    direction = "🟢" if price_change > 0 else "🔴"
-                    alert_text = f"{direction} {symbol} {interval}: {abs(price_change):.3f}% (${candle['close']})"
-                    
-                    # Добавляем корреляцию с BTC если есть
-                    if btc_correlation:
-                        alert_text += f"\n{btc_correlation}"
-                    
-                    alerts_to_send.append((user_id, alert_text))
-                    
-                    # Записываем алерт в историю
-                    await cache.record_alert(AlertRecord(
-                        user_id=user_id,
-                        symbol=symbol,
-                        interval=interval,
-                        timestamp=datetime.now(),
-                        percent_change=price_change
-                    ))
-                    
-                    # ОСТАНАВЛИВАЕМСЯ - не проверяем остальные пресеты этого пользователя
-                    alert_sent = True
-                    break
+        for k in range(triggered):
+            user_id, presets = subscribed_users[k]
+            # Самый низкий порог пользователя - первый пресет
+            preset = presets[0]
+            logger.info(f"Alert triggered for user {user_id}: {symbol} {interval} {price_change:.3f}% >= {preset.percent_change}%")
             
-            if not alert_sent:
-                logger.debug(f"No alerts triggered for user {user_id}: {abs(price_change):.3f}% below all thresholds")
+            add_alert((user_id, alert_text))
         
-        # Отправляем алерты через очередь
-        if alerts_to_send:
-            from utils.queue import message_queue
-            await message_queue.add_alerts_bulk(alerts_to_send)
-            
-            self.stats['alerts_generated'] += len(alerts_to_send)
-            logger.info(f"Sent {len(alerts_to_send)} unique alerts for {symbol} {interval}")
+        generated = len(alerts_to_send) - alerts_before
+        if generated:
+            logger.info(f"Generated {generated} unique alerts for {symbol} {interval}")
         else:
             logger.debug(f"No alerts to send for {symbol} {interval}")
     
-    async def _get_btc_correlation(self, symbol: str, interval: str, price_change: float) -> Optional[str]:
-        """Получение корреляции с биткоином"""
+    def _update_btc_data(self, interval: str, price: float, price_change: float, now_ns: int):
+        """Обновление последних данных биткоина для корреляции (now_ns - monotonic_ns пачки)"""
+        self.btc_data[interval] = (price, price_change, now_ns)
+        self._btc_correlation_memo[interval] = {}
+        logger.debug(f"Updated BTC data for {interval}: {price_change:.3f}%")
+    
+    def _get_btc_correlation(self, symbol: str, interval: str, price_change: float,
+                             now_ns: int) -> Optional[str]:
+        """Получение корреляции с биткоином (now_ns - monotonic_ns пачки)"""
         # Если это сам биткоин - не показываем корреляцию
         if symbol == 'BTCUSDT':
             return None
         
-        async with self._btc_lock:
-            btc_info = self.btc_data.get(interval)
-            
-            if not btc_info:
-                return None
-            
-            # Проверяем актуальность данных BTC (не старше 5 минут)
-            if (datetime.now() - btc_info['timestamp']).total_seconds() > 300:
-                return None
-            
-            btc_change = btc_info['change']
-            
-            # Рассчитываем разницу
-            difference = price_change - btc_change
-            
-            # Определяем тип движения
-            if abs(btc_change) < 0.1:  # BTC почти не двигается
-                if abs(price_change) > 1.0:
-                    return f"💥 BTC: {btc_change:+.3f}% (сильное движение)"
-                else:
-                    return f"➡️ BTC: {btc_change:+.3f}%"
-            
-            # Форматируем с разницей
-            if difference > 0:
-                # Монета растет сильнее BTC или падает слабее
-                return f"🚀 BTC: {btc_change:+.3f}% (разница: {difference:+.3f}%)"
-            elif difference < -1.0:
-                # Монета растет слабее BTC или падает сильнее
-                return f"⚠️ BTC: {btc_change:+.3f}% (разница: {difference:+.3f}%)"
-            else:
-                # Движение примерно одинаковое
-                return f"🔄 BTC: {btc_change:+.3f}% (разница: {difference:+.3f}%)"
+        btc_info = self.btc_data.get(interval)
+        
+        if not btc_info:
+            return None
+        
+        # Проверяем актуальность данных BTC (не старше 5 минут)
+        _, btc_change, btc_timestamp = btc_info
+        if now_ns - btc_timestamp > self._btc_max_age_ns:
+            return None
+        
+        # Строка зависит только от изменения монеты и текущих данных BTC интервала
+        memo = self._btc_correlation_memo[interval]
+        correlation = memo.get(price_change)
+        if correlation is None:
+            correlation = memo[price_change] = self._format_btc_correlation(price_change, btc_change)
+        return correlation
     
-    async def _should_send_alert(self, symbol: str, interval: str, price_change: float) -> bool:
-        """Проверка дедупликации алертов"""
-        async with self._cooldown_lock:
-            key = (symbol, interval, f"{price_change:.4f}")
-            
-            if key in self._cooldown:
-                return False
-            
-            self._cooldown[key] = datetime.now()
-            
-            # Запускаем очистку cooldown
-            asyncio.create_task(self._clear_cooldown(key))
-            
-            return True
+    @staticmethod
+    def _format_btc_correlation(price_change: float, btc_change: float) -> str:
+        """Форматирование строки корреляции с биткоином"""
+        # Рассчитываем разницу
+        difference = price_change - btc_change
+        
+        # Определяем тип движения
+        if abs(btc_change) < 0.1:  # BTC почти не двигается
+            if abs(price_change) > 1.0:
+                return f"💥 BTC: {btc_change:+.3f}% (сильное движение)"
+            else:
+                return f"➡️ BTC: {btc_change:+.3f}%"
+        
+        # Форматируем с разницей
+        if difference > 0:
+            # Монета растет сильнее BTC или падает слабее
+            return f"🚀 BTC: {btc_change:+.3f}% (разница: {difference:+.3f}%)"
+        elif difference < -1.0:
+            # Монета растет слабее BTC или падает сильнее
+            return f"⚠️ BTC: {btc_change:+.3f}% (разница: {difference:+.3f}%)"
+        else:
+            # Движение примерно одинаковое
+            return f"🔄 BTC: {btc_change:+.3f}% (разница: {difference:+.3f}%)"
     
-    async def _clear_cooldown(self, key):
-        """Очистка cooldown"""
-        await asyncio.sleep(config.ALERT_DEDUP_WINDOW)
-        async with self._cooldown_lock:
-            self._cooldown.pop(key, None)
+    def _should_send_alert(self, symbol: str, interval: str, price_change: float,
+                           now: Optional[int] = None) -> bool:
+        """Проверка дедупликации алертов (now - monotonic_ns пачки)"""
+        # Синхронно и без блокировки: между проверкой и записью нет await
+        if now is None:
+            now = time.monotonic_ns()
+        
+        # Удаляем истекшие ключи с головы очереди (окно фиксированное,
+        # поэтому очередь упорядочена по времени истечения)
+        # Сверх лимита вытесняем самые старые ключи досрочно (приблизительная
+        # дедупликация, зато память ограничена)
+        expiry_queue = self._cooldown_expiry
+        max_size = self._cooldown_max_size
+        while expiry_queue and (expiry_queue[0][0] <= now or len(expiry_queue) > max_size):
+            expiry, expired_key = expiry_queue.popleft()
+            if self._cooldown.get(expired_key) == expiry:
+                del self._cooldown[expired_key]
+        
+        # Квантуем до 4 знаков целым числом вместо форматирования строки
+        key = (symbol, interval, int(round(price_change * 10000)))
+        
+        if key in self._cooldown:
+            return False
+        
+        expiry = now + self._cooldown_window_ns
+        self._cooldown[key] = expiry
+        expiry_queue.append((expiry, key))
+        
+        return True
     
     def get_stats(self) -> Dict[str, Any]:
         """Получение статистики"""
         return {
-            **self.stats,
-            'queue_size': self.candle_queue.qsize(),
+            'candles_processed': self.candles_processed,
+            'alerts_generated': self.alerts_generated,
+            'candles_dropped': self.candles_dropped,
+            'queue_size': len(self.candle_queue),
             'cooldown_cache_size': len(self._cooldown)
         }
     
@@ -271,5 +359,5 @@ class CandleProcessor:
         """Проверка здоровья обработчика"""
         return {
             'processing': self.processing,
-            'queue_healthy': self.candle_queue.qsize() < config.CANDLE_QUEUE_SIZE * 0.8
+            'queue_healthy': len(self.candle_queue) < self._queue_limit * 0.8
         }
\ No newline at end of file
@@ -69,6 +69,9 @@ class CandleAlertService:
         # Останавливаем обработчик
         await self.processor.stop()
         
+        # Останавливаем фоновое обновление символов
+        await symbols_cache.close()
+        
         logger.info("Candle Alert Service stopped")
     
     async def _monitor_loop(self):
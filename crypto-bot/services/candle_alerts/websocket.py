@@ -1,15 +1,34 @@
 import asyncio
-import json
 import logging
+import sys
+import time
+from dataclasses import dataclass
 from typing import List, Dict, Any, Optional, Callable
-from datetime import datetime
 import aiohttp
+import orjson
 from cache.symbols_cache import symbols_cache
 from config.settings import config
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass(slots=True)
+class Candle:
+    """Свеча из kline стрима (слоты вместо dict: меньше памяти, доступ к полю без хеширования)"""
+    symbol: str
+    interval: str
+    open_time: int
+    close_time: int
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    quote_volume: float
+    trades: int
+    is_closed: bool  # Свеча закрыта? (время свечи - open_time/close_time)
+
+
 class BinanceWebSocketManager:
     """Менеджер WebSocket подключений к Binance - только WebSocket логика"""
     
@@ -26,7 +45,7 @@ class BinanceWebSocketManager:
             'messages_received': 0,
             'reconnects': 0,
             'errors': 0,
-            'last_message_time': None
+            'last_message_time': None  # time.monotonic()
         }
     
     def _generate_streams(self):
@@ -198,7 +217,8 @@ class BinanceWebSocketManager:
     async def _process_message(self, raw_data: str):
         """Обработка сообщения от Binance"""
         try:
-            data = json.loads(raw_data)
+            # orjson разбирает поток kline-сообщений в разы быстрее json
+            data = orjson.loads(raw_data)
             
             # Binance отправляет данные в формате: {"stream": "btcusdt@kline_1m", "data": {...}}
             if 'data' in data:
@@ -209,39 +229,38 @@ class BinanceWebSocketManager:
                     candle = self._parse_kline(kline_data)
                     
                     # Логируем только закрытые свечи
-                    if candle['is_closed']:
-                        logger.debug(f"Received closed candle: {candle['symbol']} {candle['interval']} {candle['close']}")
+                    if candle.is_closed:
+                        logger.debug(f"Received closed candle: {candle.symbol} {candle.interval} {candle.close}")
                     
                     # Отправляем в обработчик
                     await self.candle_callback(candle)
                     
                     # Обновляем статистику
                     self.stats['messages_received'] += 1
-                    self.stats['last_message_time'] = datetime.now()
+                    self.stats['last_message_time'] = time.monotonic()
             
         except Exception as e:
             logger.error(f"Error processing WebSocket message: {e}")
             self.stats['errors'] += 1
     
-    def _parse_kline(self, data: Dict[str, Any]) -> Dict[str, Any]:
+    def _parse_kline(self, data: Dict[str, Any]) -> Candle:
         """Парсинг данных свечи"""
         kline = data['k']
         
-        return {
-            'symbol': data['s'],
-            'interval': kline['i'],
-            'open_time': kline['t'],
-            'close_time': kline['T'],
-            'open': float(kline['o']),
-            'high': float(kline['h']),
-            'low': float(kline['l']),
-            'close': float(kline['c']),
-            'volume': float(kline['v']),
-            'quote_volume': float(kline['q']),
-            'trades': kline['n'],
-            'is_closed': kline['x'],  # Свеча закрыта?
-            'timestamp': datetime.now()
-        }
+        return Candle(
+            symbol=sys.intern(data['s']),
+            interval=sys.intern(kline['i']),
+            open_time=kline['t'],
+            close_time=kline['T'],
+            open=float(kline['o']),
+            high=float(kline['h']),
+            low=float(kline['l']),
+            close=float(kline['c']),
+            volume=float(kline['v']),
+            quote_volume=float(kline['q']),
+            trades=kline['n'],
+            is_closed=kline['x']
+        )
     
     def get_stats(self) -> Dict[str, Any]:
         """Получение статистики"""
@@ -265,7 +284,7 @@ class BinanceWebSocketManager:
         }
         
         if self.stats['last_message_time']:
-            age = (datetime.now() - self.stats['last_message_time']).total_seconds()
+            age = time.monotonic() - self.stats['last_message_time']
             health['last_message_age'] = age
             health['healthy'] = health['healthy'] and age < 60  # Нездорово если нет сообщений больше минуты
         
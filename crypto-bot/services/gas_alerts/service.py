@@ -1,8 +1,10 @@
 import asyncio
 import logging
+import time
 from typing import Optional, Dict, Any, Set, List, Tuple
 from datetime import datetime
-from collections import defaultdict
+
+import numpy as np
 
 from services.etherscan.service import etherscan_service
 from cache.memory import cache
@@ -23,8 +25,18 @@ class GasAlertService:
         self.previous_gas_price: Optional[float] = None
         self.last_check_time: Optional[datetime] = None
         
+        # История цен: кольцевой буфер (monotonic_ns, цена), монотонное время держит сегменты отсортированными
+        self._history_ts = np.empty(config.GAS_HISTORY_SIZE, dtype=np.int64)
+        self._history_prices = np.empty(config.GAS_HISTORY_SIZE, dtype=np.float64)
+        self._history_head = 0
+        self._history_count = 0
+        
         # Оптимизированная структура пресетов: threshold -> set(user_ids)
-        self.presets_by_threshold: Dict[float, Set[int]] = defaultdict(set)
+        self.presets_by_threshold: Dict[float, Set[int]] = {}
+        
+        # Отсортированный массив порогов для бинарного поиска, пересобирается лениво
+        self._thresholds: np.ndarray = np.empty(0, dtype=np.float64)
+        self._thresholds_dirty = False
         
         # Статистика
         self.stats = {
@@ -73,7 +85,8 @@ class GasAlertService:
         gas_alerts = await cache.get_all_gas_alerts()
         
         for user_id, threshold in gas_alerts:
-            self.presets_by_threshold[threshold].add(user_id)
+            self.presets_by_threshold.setdefault(threshold, set()).add(user_id)
+        self._thresholds_dirty = True
         
         logger.info(f"Loaded {len(gas_alerts)} gas presets grouped by {len(self.presets_by_threshold)} thresholds")
     
@@ -83,7 +96,8 @@ class GasAlertService:
         await self.remove_preset(user_id)
         
         # Добавляем новый
-        self.presets_by_threshold[threshold].add(user_id)
+        self.presets_by_threshold.setdefault(threshold, set()).add(user_id)
+        self._thresholds_dirty = True
         
         logger.info(f"Added gas preset for user {user_id}: {threshold} Gwei")
     
@@ -96,10 +110,24 @@ class GasAlertService:
                 # Удаляем пустые пороги
                 if not users:
                     del self.presets_by_threshold[threshold]
+                    self._thresholds_dirty = True
                 break
         
         logger.info(f"Removed gas preset for user {user_id}")
     
+    def _get_thresholds(self) -> np.ndarray:
+        """Отсортированный массив порогов (пересобирается только после изменений)"""
+        if self._thresholds_dirty:
+            thresholds = np.fromiter(
+                self.presets_by_threshold.keys(),
+                dtype=np.float64,
+                count=len(self.presets_by_threshold)
+            )
+            thresholds.sort()
+            self._thresholds = thresholds
+            self._thresholds_dirty = False
+        return self._thresholds
+    
     async def _monitor_loop(self):
         """Основной цикл мониторинга"""
         while self.running:
@@ -125,6 +153,7 @@ class GasAlertService:
             self.previous_gas_price = self.current_gas_price
             self.current_gas_price = new_price
             self.last_check_time = datetime.now()
+            self._add_gas_price(new_price)
             self.stats['checks_performed'] += 1
             
             logger.debug(f"Gas price updated: {new_price} Gwei")
@@ -156,10 +185,16 @@ class GasAlertService:
         alerts_to_send: List[Tuple[int, str]] = []
         users_to_remove = []
         
-        # Проверяем только пороги в диапазоне изменения цены
-        for threshold, user_ids in self.presets_by_threshold.items():
-            # Порог пересечен если он находится между старой и новой ценой
-            if min_price < threshold < max_price:
+        # Порог пересечен если он находится между старой и новой ценой
+        # Бинарный поиск границ строго внутри (min_price, max_price): O(log T + k)
+        thresholds = self._get_thresholds()
+        lo = np.searchsorted(thresholds, min_price, side='right')
+        hi = np.searchsorted(thresholds, max_price, side='left')
+        crossed = thresholds[lo:hi]
+        
+        for threshold in crossed.tolist():
+            user_ids = self.presets_by_threshold.get(threshold)
+            if user_ids:
                 logger.info(f"Gas price crossed threshold {threshold} Gwei: {self.previous_gas_price} → {self.current_gas_price}")
                 
                 # Определяем направление
@@ -201,6 +236,38 @@ class GasAlertService:
             # Удаляем из сервиса
             await self.remove_preset(user_id)
     
+    def _add_gas_price(self, price: float) -> None:
+        """Запись цены в кольцевой буфер истории"""
+        head = self._history_head
+        self._history_ts[head] = time.monotonic_ns()
+        self._history_prices[head] = price
+        self._history_head = (head + 1) % len(self._history_ts)
+        self._history_count = min(self._history_count + 1, len(self._history_ts))
+    
+    def get_gas_price_trend(self, minutes: int) -> Optional[Tuple[float, float]]:
+        """Цена в начале окна и последняя цена за последние minutes минут"""
+        if self._history_count == 0:
+            return None
+        
+        size = len(self._history_ts)
+        head = self._history_head
+        latest = (head - 1) % size
+        cutoff = time.monotonic_ns() - minutes * 60 * 1_000_000_000
+        
+        # Буфер хранится двумя отсортированными сегментами: [head:size) и [0:head)
+        if self._history_count < size:
+            segments = ((0, head),)
+        else:
+            segments = ((head, size), (0, head))
+        
+        start = latest
+        for lo, hi in segments:
+            if hi > lo and self._history_ts[hi - 1] >= cutoff:
+                start = lo + int(np.searchsorted(self._history_ts[lo:hi], cutoff))
+                break
+        
+        return float(self._history_prices[start]), float(self._history_prices[latest])
+    
     def get_current_gas_price(self) -> Optional[float]:
         """Получение текущей цены газа из памяти"""
         return self.current_gas_price
@@ -217,6 +284,7 @@ class GasAlertService:
             'last_check_time': self.last_check_time.isoformat() if self.last_check_time else None,
             'total_presets': sum(len(users) for users in self.presets_by_threshold.values()),
             'unique_thresholds': len(self.presets_by_threshold),
+            'history_size': self._history_count,
             'etherscan_stats': etherscan_stats
         }
     
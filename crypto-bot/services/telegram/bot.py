@@ -37,6 +37,13 @@ class TelegramBot:
         register_all_handlers(self.dp)
         
         self.running = False
+        
+        # Устанавливается когда БД и кеш готовы для остальных сервисов
+        self._ready = asyncio.Event()
+    
+    async def wait_ready(self):
+        """Ожидание инициализации БД и кеша"""
+        await self._ready.wait()
     
     async def start(self):
         """Запуск бота"""
@@ -50,6 +57,7 @@ class TelegramBot:
             # Загрузка данных в кеш
             await cache.load_from_db(db_manager)
             logger.info("Cache loaded from database")
+            self._ready.set()
             
             # Запуск автономной очереди сообщений
             await message_queue.start_processing()
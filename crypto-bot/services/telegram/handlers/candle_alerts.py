@@ -312,8 +312,13 @@ async def process_manual_pairs(message: types.Message, state: FSMContext):
         )
     
     # Проверяем пары против кеша символов
-    valid_pairs = symbols_cache.validate_symbols(pairs)
-    not_found_pairs = [p for p in pairs if p not in valid_pairs]
+    valid_pairs = []
+    not_found_pairs = []
+    for pair in pairs:
+        if symbols_cache.contains(pair):
+            valid_pairs.append(pair)
+        else:
+            not_found_pairs.append(pair)
     
     if not valid_pairs:
         await message.answer(
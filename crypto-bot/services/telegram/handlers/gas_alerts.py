@@ -158,13 +158,21 @@ async def gas_chart(callback: types.CallbackQuery):
         )
         return
     
-    # Показываем текущую цену
-    await callback.message.answer(
+    text = (
         f"📊 <b>Информация о газе Ethereum</b>\n\n"
         f"💰 Текущая цена: {current_price} Gwei\n"
-        f"🕐 Обновляется каждые {config.GAS_CHECK_INTERVAL} секунд",
-        parse_mode="HTML"
     )
+    
+    # Добавляем тренд за последнее окно если есть история
+    trend = gas_alert_service.get_gas_price_trend(config.GAS_TREND_WINDOW)
+    if trend:
+        start_price, last_price = trend
+        text += f"📈 За {config.GAS_TREND_WINDOW} мин: {start_price} → {last_price} Gwei\n"
+    
+    text += f"🕐 Обновляется каждые {config.GAS_CHECK_INTERVAL} секунд"
+    
+    # Показываем текущую цену
+    await callback.message.answer(text, parse_mode="HTML")
 
 
 def register_gas_alerts_handlers(dp: Dispatcher):
@@ -212,10 +212,9 @@ async def show_gas_alerts_menu(message_or_callback):
     else:
         user_id = message_or_callback.from_user.id
     
-    # Получаем информацию о газ пресете
-    gas_alert = await db_manager.get_gas_alert(user_id)
-    has_alert = gas_alert is not None
-    threshold = gas_alert.get('threshold_gwei') if gas_alert else None
+    # Получаем информацию о газ пресете из кеша (синхронизирован с БД при изменениях)
+    threshold = cache.gas_alerts.get(user_id)
+    has_alert = threshold is not None
     
     # Получаем текущую цену газа из сервиса (из памяти)
     from services.gas_alerts.service import gas_alert_service
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули бота импортируются от корня crypto-bot (как при запуске main.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
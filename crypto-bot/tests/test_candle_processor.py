@@ -0,0 +1,122 @@
+import asyncio
+
+from cache.memory import MemoryCache, PresetData
+from services.candle_alerts import processor as processor_module
+from services.candle_alerts.processor import CandleProcessor
+from services.candle_alerts.websocket import Candle
+
+SECOND_NS = 1_000_000_000
+
+
+def make_candle(symbol, interval, open_price, close_price):
+    return Candle(
+        symbol=symbol,
+        interval=interval,
+        open_time=0,
+        close_time=0,
+        open=open_price,
+        high=max(open_price, close_price),
+        low=min(open_price, close_price),
+        close=close_price,
+        volume=0.0,
+        quote_volume=0.0,
+        trades=0,
+        is_closed=True
+    )
+
+
+def subscribed_cache(thresholds_by_user):
+    cache = MemoryCache()
+    
+    async def scenario():
+        for preset_id, (user_id, percent_change) in enumerate(thresholds_by_user, start=1):
+            await cache.add_preset(PresetData(
+                id=preset_id,
+                user_id=user_id,
+                name=f"preset {preset_id}",
+                pairs=['ETHUSDT'],
+                intervals=['1m'],
+                percent_change=percent_change
+            ))
+    
+    asyncio.run(scenario())
+    return cache
+
+
+def test_triggered_users_are_threshold_prefix():
+    cache = subscribed_cache([(10, 3.0), (20, 0.5), (30, 2.0), (40, 1.0), (40, 5.0)])
+    processor = CandleProcessor()
+    fanout = cache.get_fanout('ETHUSDT', '1m')
+    
+    cases = [(0.4, []), (1.0, [20, 40]), (2.5, [20, 40, 30]), (-3.0, [20, 40, 30, 10])]
+    for step, (price_change, expected_users) in enumerate(cases):
+        alerts = []
+        candle = make_candle('ETHUSDT', '1m', 100.0, 100.0 + price_change)
+        processor._process_candle(candle, price_change, fanout, alerts, step * 120 * SECOND_NS)
+        assert [user_id for user_id, _ in alerts] == expected_users
+        # Текст алерта общий для всех получателей
+        assert len({text for _, text in alerts}) <= 1
+
+
+def test_process_batch_sends_alerts_for_crossed_thresholds(monkeypatch):
+    cache = subscribed_cache([(10, 1.0), (20, 3.0)])
+    sent = []
+    
+    async def add_candle_alerts(alerts):
+        sent.extend(alerts)
+    
+    monkeypatch.setattr(processor_module, 'cache', cache)
+    monkeypatch.setattr(processor_module.message_queue, 'add_candle_alerts', add_candle_alerts)
+    
+    processor = CandleProcessor()
+    batch = [
+        make_candle('ETHUSDT', '1m', 100.0, 102.0),  # +2%: только пользователь 10
+        make_candle('ETHUSDT', '5m', 100.0, 110.0),  # нет подписчиков
+        make_candle('BTCUSDT', '1m', 100.0, 110.0),  # нет подписчиков
+    ]
+    asyncio.run(processor._process_batch(batch))
+    
+    assert [user_id for user_id, _ in sent] == [10]
+    assert sent[0][1].startswith("🟢 ETHUSDT 1m: 2.000%")
+    assert processor.alerts_generated == 1
+
+
+def test_dedup_blocks_repeat_until_window_expires():
+    processor = CandleProcessor()
+    processor._cooldown_window_ns = 60 * SECOND_NS
+    
+    assert processor._should_send_alert('ETHUSDT', '1m', 1.23456, now=0)
+    assert not processor._should_send_alert('ETHUSDT', '1m', 1.23456, now=59 * SECOND_NS)
+    # Другое изменение или интервал - другой ключ
+    assert processor._should_send_alert('ETHUSDT', '1m', 1.3, now=59 * SECOND_NS)
+    assert processor._should_send_alert('ETHUSDT', '5m', 1.23456, now=59 * SECOND_NS)
+    # Окно истекло: ключ удаляется с головы очереди
+    assert processor._should_send_alert('ETHUSDT', '1m', 1.23456, now=60 * SECOND_NS)
+    assert len(processor._cooldown) == 3
+
+
+def test_dedup_evicts_oldest_keys_over_max_size():
+    processor = CandleProcessor()
+    processor._cooldown_window_ns = 60 * SECOND_NS
+    processor._cooldown_max_size = 3
+    
+    for k in range(10):
+        assert processor._should_send_alert('ETHUSDT', '1m', float(k), now=k)
+        assert len(processor._cooldown) <= 4
+        assert len(processor._cooldown_expiry) == len(processor._cooldown)
+    
+    # Самые старые ключи вытеснены досрочно, свежие еще блокируются
+    assert processor._should_send_alert('ETHUSDT', '1m', 0.0, now=20)
+    assert not processor._should_send_alert('ETHUSDT', '1m', 9.0, now=21)
+
+
+def test_btc_correlation_memo_resets_on_btc_update():
+    processor = CandleProcessor()
+    
+    processor._update_btc_data('1m', 100.0, 0.5, 0)
+    assert processor._get_btc_correlation('ETHUSDT', '1m', 2.0, 1) == "🚀 BTC: +0.500% (разница: +1.500%)"
+    
+    processor._update_btc_data('1m', 100.0, -0.5, 2)
+    assert processor._get_btc_correlation('ETHUSDT', '1m', 2.0, 3) == "🚀 BTC: -0.500% (разница: +2.500%)"
+    assert processor._get_btc_correlation('BTCUSDT', '1m', 2.0, 3) is None
+    assert processor._get_btc_correlation('ETHUSDT', '1m', 2.0, 301 * SECOND_NS) is None
@@ -0,0 +1,71 @@
+import asyncio
+
+from models import database
+from services.gas_alerts import service as gas_module
+from services.gas_alerts.service import GasAlertService
+
+MINUTE_NS = 60 * 1_000_000_000
+
+
+def test_trend_window_uses_ring_segments():
+    service = GasAlertService()
+    size = len(service._history_ts)
+    
+    assert service.get_gas_price_trend(60) is None
+    
+    # Заполняем буфер с переполнением: последняя цена - size + 4
+    for price in range(size + 5):
+        service._add_gas_price(float(price))
+    
+    # Раскладываем метки времени по минутам: цене с индексом age от конца - age с половиной минут
+    latest = (service._history_head - 1) % size
+    now = int(service._history_ts[latest])
+    for age in range(size):
+        service._history_ts[(latest - age) % size] = now - age * MINUTE_NS - MINUTE_NS // 2
+    
+    # В окно 10 минут попадают цены возрастом 0..9 минут
+    start, last = service.get_gas_price_trend(10)
+    assert last == float(size + 4)
+    assert start == float(size + 4 - 9)
+    
+    # Окно длиннее истории - от самой старой цены
+    start, _ = service.get_gas_price_trend(size * 2)
+    assert start == 5.0
+
+
+def test_crossings_alert_only_thresholds_strictly_between_prices(monkeypatch):
+    service = GasAlertService()
+    sent = []
+    deleted = []
+    
+    async def add_alerts_bulk(alerts):
+        sent.extend(alerts)
+    
+    async def delete_gas_alert(user_id):
+        deleted.append(user_id)
+        return True
+    
+    async def remove_gas_alert(user_id):
+        pass
+    
+    monkeypatch.setattr('utils.queue.message_queue.add_alerts_bulk', add_alerts_bulk)
+    monkeypatch.setattr(database.db_manager, 'delete_gas_alert', delete_gas_alert)
+    monkeypatch.setattr(gas_module.cache, 'remove_gas_alert', remove_gas_alert)
+    
+    async def scenario():
+        await service.add_preset(1, 10.0)
+        await service.add_preset(2, 15.0)
+        await service.add_preset(3, 20.0)
+        await service.add_preset(4, 25.0)
+        
+        service.previous_gas_price = 10.0
+        service.current_gas_price = 22.0
+        await service._check_crossings_optimized()
+    
+    asyncio.run(scenario())
+    
+    assert sorted(user_id for user_id, _ in sent) == [2, 3]
+    assert all(text.startswith("📈") for _, text in sent)
+    assert sorted(deleted) == [2, 3]
+    assert sorted(service.presets_by_threshold) == [10.0, 25.0]
+    assert service._get_thresholds().tolist() == [10.0, 25.0]
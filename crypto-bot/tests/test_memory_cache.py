@@ -0,0 +1,189 @@
+import asyncio
+import random
+
+from cache.memory import MemoryCache, PresetData
+
+
+def make_preset(preset_id, user_id, pairs, intervals, percent_change, is_active=True):
+    return PresetData(
+        id=preset_id,
+        user_id=user_id,
+        name=f"preset {preset_id}",
+        pairs=pairs,
+        intervals=intervals,
+        percent_change=percent_change,
+        is_active=is_active
+    )
+
+
+def expected_state(cache):
+    """Подписки и счетчики, пересчитанные с нуля по активным пресетам"""
+    subscriptions = {}
+    for preset in cache.presets.values():
+        if not preset.is_active:
+            continue
+        for symbol in preset.pairs:
+            for interval in preset.intervals:
+                users = subscriptions.setdefault((symbol, interval), {})
+                users.setdefault(preset.user_id, set()).add(preset.id)
+    
+    symbol_refs = {}
+    for symbol, _ in subscriptions:
+        symbol_refs[symbol] = symbol_refs.get(symbol, 0) + 1
+    
+    total_subs = sum(len(users) for users in subscriptions.values())
+    return subscriptions, symbol_refs, total_subs
+
+
+def assert_consistent(cache):
+    subscriptions, symbol_refs, total_subs = expected_state(cache)
+    
+    actual = {
+        key: {user_id: set(preset_ids) for user_id, preset_ids in users.items()}
+        for key, users in cache.active_subscriptions.items()
+    }
+    assert actual == subscriptions
+    assert cache._symbol_refs == symbol_refs
+    assert cache._total_subs == total_subs
+    assert set(cache._fanout) == set(subscriptions)
+    assert set(cache._min_threshold) == set(subscriptions)
+    
+    for key, (entries, thresholds) in cache._fanout.items():
+        assert {user_id for user_id, _ in entries} == set(subscriptions[key])
+        assert list(thresholds) == sorted(thresholds)
+        assert cache._min_threshold[key] == thresholds[0]
+        for (user_id, presets), threshold in zip(entries, thresholds):
+            assert {preset.id for preset in presets} == subscriptions[key][user_id]
+            assert [p.percent_change for p in presets] == sorted(p.percent_change for p in presets)
+            assert presets[0].percent_change == threshold
+
+
+def test_fanout_sorted_by_lowest_user_threshold():
+    cache = MemoryCache()
+    
+    async def scenario():
+        await cache.add_preset(make_preset(1, 10, ['BTCUSDT'], ['1m'], 3.0))
+        await cache.add_preset(make_preset(2, 20, ['BTCUSDT'], ['1m'], 5.0))
+        await cache.add_preset(make_preset(3, 20, ['BTCUSDT'], ['1m'], 1.0))
+        await cache.add_preset(make_preset(4, 30, ['BTCUSDT'], ['1m'], 2.0))
+    
+    asyncio.run(scenario())
+    
+    entries, thresholds = cache.get_fanout('BTCUSDT', '1m')
+    assert [user_id for user_id, _ in entries] == [20, 30, 10]
+    assert thresholds == (1.0, 2.0, 3.0)
+    assert [preset.id for preset in entries[0][1]] == [3, 2]
+    assert cache.get_min_threshold('BTCUSDT', '1m') == 1.0
+
+
+def test_fanout_of_unknown_key_is_empty():
+    cache = MemoryCache()
+    
+    assert cache.get_fanout('BTCUSDT', '1m') == ((), ())
+    assert cache.get_min_threshold('BTCUSDT', '1m') == float('inf')
+
+
+def test_inactive_preset_is_not_subscribed_until_toggled():
+    cache = MemoryCache()
+    
+    async def scenario():
+        await cache.add_preset(make_preset(1, 10, ['BTCUSDT', 'ETHUSDT'], ['1m', '5m'], 1.0, is_active=False))
+        assert cache.get_fanout('BTCUSDT', '1m') == ((), ())
+        
+        await cache.update_preset_status(1, True)
+        assert_consistent(cache)
+        assert cache._total_subs == 4
+        assert cache._symbol_refs == {'BTCUSDT': 2, 'ETHUSDT': 2}
+        
+        await cache.update_preset_status(1, False)
+        assert_consistent(cache)
+        assert cache._total_subs == 0
+        assert cache._symbol_refs == {}
+        assert cache._fanout == {}
+    
+    asyncio.run(scenario())
+
+
+def test_user_with_two_presets_on_one_key_counts_once():
+    cache = MemoryCache()
+    
+    async def scenario():
+        await cache.add_preset(make_preset(1, 10, ['BTCUSDT'], ['1m'], 1.0))
+        await cache.add_preset(make_preset(2, 10, ['BTCUSDT'], ['1m'], 2.0))
+        assert cache._total_subs == 1
+        
+        await cache.remove_preset(1)
+        assert_consistent(cache)
+        assert cache.get_fanout('BTCUSDT', '1m')[1] == (2.0,)
+        
+        await cache.remove_preset(2)
+        assert_consistent(cache)
+        assert cache._total_subs == 0
+    
+    asyncio.run(scenario())
+
+
+def test_random_add_remove_toggle_keeps_state_consistent():
+    rng = random.Random(7)
+    cache = MemoryCache()
+    
+    async def scenario():
+        next_id = 0
+        for _ in range(1500):
+            action = rng.random()
+            if action < 0.45 or not cache.presets:
+                next_id += 1
+                await cache.add_preset(make_preset(
+                    next_id,
+                    rng.randint(1, 6),
+                    rng.sample(['BTCUSDT', 'ETHUSDT', 'SOLUSDT', 'XRPUSDT'], rng.randint(1, 3)),
+                    rng.sample(['1m', '5m', '1h'], rng.randint(1, 2)),
+                    rng.choice([0.5, 1.0, 2.0, 3.0]),
+                    is_active=rng.random() < 0.7
+                ))
+            elif action < 0.7:
+                await cache.remove_preset(rng.choice(list(cache.presets)))
+            else:
+                await cache.update_preset_status(rng.choice(list(cache.presets)), rng.random() < 0.5)
+            assert_consistent(cache)
+    
+    asyncio.run(scenario())
+
+
+def test_load_from_db_matches_incremental_adds():
+    rows = [
+        {'id': i, 'user_id': i % 5, 'name': 'p', 'pairs': ['BTCUSDT', 'ETHUSDT'],
+         'intervals': ['1m', '5m'], 'percent_change': 1.0 + i % 3, 'is_active': i % 4 != 0}
+        for i in range(1, 30)
+    ]
+    
+    class FakeDB:
+        async def get_all_active_presets(self):
+            return rows
+        
+        async def get_all_gas_alerts(self):
+            return [{'user_id': 1, 'threshold_gwei': 20}]
+    
+    loaded = MemoryCache()
+    incremental = MemoryCache()
+    
+    async def scenario():
+        await loaded.load_from_db(FakeDB())
+        for row in rows:
+            await incremental.add_preset(make_preset(
+                row['id'], row['user_id'], row['pairs'], row['intervals'],
+                row['percent_change'], row['is_active']
+            ))
+    
+    asyncio.run(scenario())
+    
+    assert_consistent(loaded)
+    def plan(cache):
+        return {
+            key: ([(user_id, [preset.id for preset in presets]) for user_id, presets in entries], thresholds)
+            for key, (entries, thresholds) in cache._fanout.items()
+        }
+    
+    assert plan(loaded) == plan(incremental)
+    assert loaded._total_subs == incremental._total_subs
+    assert asyncio.run(loaded.get_all_gas_alerts()) == ((1, 20.0),)
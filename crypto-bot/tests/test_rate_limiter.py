@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+import numpy as np
+
+from utils.rate_limiter import UserRateLimiter
+
+
+def test_window_rolls_over_after_period():
+    limiter = UserRateLimiter(rate=2, per=0.2)
+    
+    async def scenario():
+        assert await limiter.acquire(1) == 0.0
+        assert await limiter.acquire(1) == 0.0
+        # Третий вызов в окне ждет, пока выйдет самый старый
+        started = time.monotonic()
+        waited = await limiter.acquire(1)
+        assert waited > 0.0
+        assert time.monotonic() - started >= 0.15
+        # Другой пользователь не ограничен чужим окном
+        assert await limiter.acquire(2) == 0.0
+    
+    asyncio.run(scenario())
+
+
+def test_window_is_free_again_after_period():
+    limiter = UserRateLimiter(rate=1, per=0.05)
+    
+    async def scenario():
+        assert await limiter.acquire(1) == 0.0
+        await asyncio.sleep(0.06)
+        assert await limiter.acquire(1) == 0.0
+    
+    asyncio.run(scenario())
+
+
+def test_buffer_grows_in_chunks_and_keeps_history():
+    limiter = UserRateLimiter(rate=3, per=60.0, chunk_size=2)
+    
+    async def scenario():
+        await limiter.acquire(100, n=3)
+        for user_id in range(1, 5):
+            await limiter.acquire(user_id)
+    
+    asyncio.run(scenario())
+    
+    assert limiter._calls.shape == (6, 3)
+    assert len(limiter._heads) == 6
+    assert len(set(limiter._rows.values())) == 5
+    # История первого пользователя пережила расширение буфера
+    row = limiter._rows[100]
+    assert np.isfinite(limiter._calls[row]).all()
+    assert limiter._heads[row] == 0
+    # Новые строки выделенного блока пустые
+    assert np.isneginf(limiter._calls[5]).all()
+    assert limiter.get_stats() == {'total_users': 5, 'active_limiters': 5}
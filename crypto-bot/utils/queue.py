@@ -1,9 +1,10 @@
 import asyncio
 from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
-from datetime import datetime, timedelta
+from datetime import datetime
 from collections import defaultdict, deque
 import logging
+import time
 from enum import Enum
 
 from config.settings import config
@@ -50,7 +51,7 @@ class MessageQueue:
         self.processing = False
         self._lock = asyncio.Lock()
         
-        # Rate limiting: 30 сообщений в минуту
+        # Rate limiting: 30 сообщений в минуту (time.monotonic() отправок)
         self._send_times = deque(maxlen=config.QUEUE_MAX_MESSAGES_PER_MINUTE)
         
         # Планировщик отправки
@@ -164,10 +165,11 @@ class MessageQueue:
     
     def _can_send_message(self) -> bool:
         """Проверка можем ли отправить сообщение (rate limit 30/минуту)"""
-        now = datetime.now()
+        now = time.monotonic()
+        window = config.QUEUE_RATE_LIMIT_WINDOW
         
         # Удаляем отправки старше 1 минуты
-        while self._send_times and (now - self._send_times[0]) > timedelta(seconds=config.QUEUE_RATE_LIMIT_WINDOW):
+        while self._send_times and now - self._send_times[0] > window:
             self._send_times.popleft()
         
         # Можем отправить если отправили меньше 30 сообщений за последнюю минуту
@@ -311,7 +313,7 @@ class MessageQueue:
                 )
                 
                 # Записываем время отправки для rate limiting
-                self._send_times.append(datetime.now())
+                self._send_times.append(time.monotonic())
                 
                 self.stats['messages_sent'] += 1
                 logger.info(f"Message sent successfully to user {message_to_send.user_id}")
@@ -361,7 +363,7 @@ class MessageQueue:
                 )
                 
                 # Записываем время отправки для rate limiting
-                self._send_times.append(datetime.now())
+                self._send_times.append(time.monotonic())
                 
                 self.stats['messages_sent'] += 1
                 self.stats['candle_alerts_sent'] += len(alerts_to_send)
@@ -407,7 +409,7 @@ class MessageQueue:
                 )
                 
                 # Записываем время отправки для rate limiting
-                self._send_times.append(datetime.now())
+                self._send_times.append(time.monotonic())
                 
                 self.stats['messages_sent'] += 1
                 self.stats['gas_alerts_sent'] += len(alerts_to_send)
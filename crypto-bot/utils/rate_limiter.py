@@ -1,11 +1,12 @@
 import asyncio
 from typing import Dict, Optional
 from collections import defaultdict, deque
-from datetime import datetime, timedelta
 from config.settings import config
 import time
 import logging
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
 
@@ -31,7 +32,7 @@ class RateLimiter:
         Возвращает время ожидания в секундах
         """
         async with self._lock:
-            now = time.time()
+            now = time.monotonic()
             
             # Удаляем старые вызовы
             while self.calls and self.calls[0] <= now - self.per:
@@ -50,7 +51,7 @@ class RateLimiter:
             # Ждем и добавляем
             await asyncio.sleep(wait_time)
             for _ in range(n):
-                self.calls.append(time.time())
+                self.calls.append(time.monotonic())
             
             return wait_time
     
@@ -66,25 +67,66 @@ class RateLimiter:
 class UserRateLimiter:
     """Rate limiter с отдельными лимитами для каждого пользователя"""
     
-    def __init__(self, rate: int, per: float = 1.0):
+    def __init__(self, rate: int, per: float = 1.0, chunk_size: int = 1024):
+        """
+        Args:
+            rate: Количество разрешенных вызовов на пользователя
+            per: Период в секундах
+            chunk_size: На сколько пользователей расширять буфер за раз
+        """
         self.rate = rate
         self.per = per
-        self.user_limiters: Dict[int, RateLimiter] = {}
-        self._lock = asyncio.Lock()
+        self.chunk_size = chunk_size
+        
+        # Окна всех пользователей: строка на пользователя,
+        # последние rate вызовов по кругу (time.monotonic())
+        self._calls = np.full((chunk_size, rate), -np.inf, dtype=np.float64)
+        self._heads = np.zeros(chunk_size, dtype=np.int64)
+        self._rows: Dict[int, int] = {}
+    
+    def _get_row(self, user_id: int) -> int:
+        """Строка буфера пользователя (выделяется при первом обращении)"""
+        row = self._rows.get(user_id)
+        if row is None:
+            row = len(self._rows)
+            if row >= len(self._heads):
+                # Расширяем буфер блоком, а не по одному пользователю
+                self._calls = np.vstack((
+                    self._calls,
+                    np.full((self.chunk_size, self.rate), -np.inf, dtype=np.float64)
+                ))
+                self._heads = np.concatenate((self._heads, np.zeros(self.chunk_size, dtype=np.int64)))
+            self._rows[user_id] = row
+        return row
     
     async def acquire(self, user_id: int, n: int = 1) -> float:
         """Получение разрешения для конкретного пользователя"""
-        async with self._lock:
-            if user_id not in self.user_limiters:
-                self.user_limiters[user_id] = RateLimiter(self.rate, self.per)
+        row = self._get_row(user_id)
+        total_wait = 0.0
+        
+        for _ in range(n):
+            while True:
+                now = time.monotonic()
+                head = int(self._heads[row])
+                # Самый старый из последних rate вызовов лежит на позиции head
+                wait_time = float(self._calls[row, head]) + self.per - now
+                if wait_time <= 0:
+                    break
+                total_wait += wait_time
+                await asyncio.sleep(wait_time)
+            
+            self._calls[row, head] = now
+            self._heads[row] = (head + 1) % self.rate
         
-        return await self.user_limiters[user_id].acquire(n)
+        return total_wait
     
     def get_stats(self) -> Dict[str, int]:
         """Получение статистики по пользователям"""
+        users = len(self._rows)
+        recent = self._calls[:users] > time.monotonic() - self.per
         return {
-            'total_users': len(self.user_limiters),
-            'active_limiters': sum(1 for l in self.user_limiters.values() if len(l.calls) > 0)
+            'total_users': users,
+            'active_limiters': int(np.count_nonzero(recent.any(axis=1)))
         }
 
 
@@ -158,7 +200,7 @@ class AdaptiveRateLimiter:
         self.successes = deque(maxlen=100)
         
         self._lock = asyncio.Lock()
-        self._last_adjustment = time.time()
+        self._last_adjustment = time.monotonic()
         self._adjustment_interval = config.ADAPTIVE_LIMITER_ADJUSTMENT_INTERVAL  # Корректировка раз в минуту
     
     async def acquire(self, n: int = 1) -> float:
@@ -170,14 +212,14 @@ class AdaptiveRateLimiter:
         """Запись результата для адаптации"""
         async with self._lock:
             if success:
-                self.successes.append(time.time())
+                self.successes.append(time.monotonic())
             else:
-                self.errors.append(time.time())
+                self.errors.append(time.monotonic())
     
     async def _maybe_adjust_rate(self) -> None:
         """Корректировка rate limit на основе статистики"""
         async with self._lock:
-            now = time.time()
+            now = time.monotonic()
             if now - self._last_adjustment < self._adjustment_interval:
                 return
             